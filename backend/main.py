@@ -1,46 +1,99 @@
 import logging
+import os
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from routers import audio_llm, speaker_profiles
+from services.gemini_service import GeminiService, configure_gemini
+from services.transcription_batcher import get_transcription_batcher
 from fastapi import Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, ORJSONResponse
 from typing import Optional
 from fastapi.requests import Request
-import json
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path=".env")  # Adjust the path to point to your .env file
 
-# Configure logging
+# Configure logging (set LOG_LEVEL=DEBUG in .env for verbose local output)
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Per-request access lines are costly at high QPS
+if os.getenv("DISABLE_ACCESS_LOG") == "1":
+    logging.getLogger("uvicorn.access").disabled = True
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Update CORS config for iOS client
+# Starlette treats "*.domain" entries literally, so match the wildcard hosts
+# (ngrok tunnels, Tailscale) with a single pre-compiled regex instead.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "https://localhost:3000",
-        "https://*.ngrok-free.app",
-        "https://*.ts.net",  # Allow Tailscale domains
-        "*"
-    ],
+    allow_origin_regex=r"^(https?://localhost:3000|https://[^/]+\.ngrok-free\.app|https://[^/]+\.ts\.net)$",
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization"],
     expose_headers=["*"]
 )
 
+class StreamAwareGZipMiddleware:
+    """GZipMiddleware that passes streamed routes through untouched
+
+    Starlette's GZipResponder buffers chunks in zlib without flushing, which
+    would hold back NDJSON turns until the stream ends.
+    """
+
+    def __init__(self, app, exclude_paths, **gzip_options):
+        self.app = app
+        self.gzip = GZipMiddleware(app, **gzip_options)
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+# Transcription/analysis JSON is HTML-heavy and compresses well for mobile
+# clients; application/x-ndjson streams are excluded so each turn is sent as
+# soon as it's parsed
+STREAMING_PATHS = ("/api/v1/upload/transcribe-stream",)
+app.add_middleware(
+    StreamAwareGZipMiddleware,
+    exclude_paths=STREAMING_PATHS,
+    minimum_size=1024,
+    compresslevel=5
+)
+
 # Include routers - remove all prefixes
 app.include_router(audio_llm.router, prefix="/api/v1")
 app.include_router(speaker_profiles.router)
 
+@app.on_event("startup")
+async def warm_gemini_client():
+    """Configure the SDK and build the shared transcription model up front so
+    every request reuses the same warm client instead of the first one paying
+    for connection setup"""
+    configure_gemini()
+    GeminiService.create_transcription_service()
+
+@app.on_event("startup")
+async def start_transcription_batcher():
+    batcher = get_transcription_batcher(audio_llm.TRANSCRIPTION_PROMPT)
+    if batcher:
+        batcher.start()
+
+@app.on_event("shutdown")
+async def stop_transcription_batcher():
+    """Fail queued and in-flight batched requests instead of leaving them hanging"""
+    batcher = get_transcription_batcher(audio_llm.TRANSCRIPTION_PROMPT)
+    if batcher:
+        await batcher.stop()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
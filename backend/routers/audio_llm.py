@@ -1,58 +1,31 @@
 import os
+import re
 import logging
-import json
-import base64
-import binascii
-from typing import Optional
-from fastapi import APIRouter, HTTPException
-import google.generativeai as genai
-from google.ai.generativelanguage_v1beta.types import content
+import pybase64 as base64  # SIMD-accelerated drop-in for the stdlib module
+import hashlib
+from typing import List, Optional, Union
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
-from datetime import datetime
 from services.audio_upload import AudioUploadService
-from services.audio_validation import AudioValidator  # Add this import
-from services.gemini_service import GeminiService, GeminiConfig
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from services.gemini_service import GeminiService, TranscriptionResponse
+from services.cache import TTLCache
+from services.transcription_batcher import get_transcription_batcher
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
     tags=["audio-processing"],
+    default_response_class=ORJSONResponse,
     responses={404: {"description": "Not found"}},
 )
 
-# Base models for extensibility
-class BaseAnalysis(BaseModel):
-    timestamp: Optional[datetime] = Field(default_factory=datetime.utcnow)
-    metadata: Optional[dict] = Field(default_factory=dict)
-
+# Base models for extensibility; response models (TranscriptionResponse and
+# its turns) are the ones defined in services.gemini_service
 class BaseRequest(BaseModel):
     user_id: Optional[str] = None
     session_id: Optional[str] = None
     request_metadata: Optional[dict] = Field(default_factory=dict)
 
-class ToneAnalysis(BaseAnalysis):
-    tone: str
-    indicators: list[str]
-    confidence_score: Optional[float] = None
-    additional_metrics: Optional[dict] = None
-
-class ConversationTurn(BaseAnalysis):
-    diarization_html: Optional[str] = None
-    transcription_html: Optional[str] = None
-    timestamps_html: Optional[str] = None
-    tone_analysis: Optional[ToneAnalysis] = None
-    confidence: Optional[float] = None
-    summary: Optional[str] = None
-    raw_data: Optional[dict] = None
-    segments: Optional[list[dict]] = None
-
-class TranscriptionResponse(BaseModel):
-    full_audio_transcribed: bool
-    conversation_analysis: list[ConversationTurn]
-    metadata: Optional[dict] = None
-    processing_stats: Optional[dict] = None
-
 class AudioRequest(BaseRequest):
     audio_base64: str
     audio_format: Optional[str] = None
@@ -68,75 +41,91 @@ class UploadResponse(BaseModel):
 class AnalysisRequest(BaseRequest):
     file_id: str
     analysis_options: Optional[dict] = None
-# we will be using many different schemas and prompts so we need this more reusable
-def create_transcription_schema():
-    """Create schema for transcription response"""
-    return content.Schema(
-        type=content.Type.OBJECT,
-        required=["full_audio_transcribed", "conversation_analysis"],
-        properties={
-            "full_audio_transcribed": content.Schema(
-                type=content.Type.BOOLEAN,
-                description="Indicates if the entire audio was successfully transcribed"
-            ),
-            "conversation_analysis": content.Schema(
-                type=content.Type.ARRAY,
-                description="List of analyzed conversation turns",
-                items=content.Schema(
-                    type=content.Type.OBJECT,
-                    required=[
-                        "diarization_html",
-                        "transcription_html",
-                        "timestamps_html",
-                        "tone_analysis",
-                        "confidence",
-                        "summary"
-                    ],
-                    properties={
-                        "diarization_html": content.Schema(
-                            type=content.Type.STRING,
-                            description="Speaker identification in HTML format"
-                        ),
-                        "transcription_html": content.Schema(
-                            type=content.Type.STRING,
-                            description="Transcribed text in HTML format"
-                        ),
-                        "timestamps_html": content.Schema(
-                            type=content.Type.STRING,
-                            description="Timestamp markers in HTML format"
-                        ),
-                        "tone_analysis": content.Schema(
-                            type=content.Type.OBJECT,
-                            required=["tone", "indicators"],
-                            properties={
-                                "tone": content.Schema(
-                                    type=content.Type.STRING,
-                                    description="Identified emotional tone"
-                                ),
-                                "indicators": content.Schema(
-                                    type=content.Type.ARRAY,
-                                    items=content.Schema(type=content.Type.STRING),
-                                    description="Evidence supporting tone analysis"
-                                )
-                            }
-                        ),
-                        "confidence": content.Schema(
-                            type=content.Type.NUMBER,
-                            description="Confidence score for the analysis"
-                        ),
-                        "summary": content.Schema(
-                            type=content.Type.STRING,
-                            description="Brief summary of the conversation turn"
-                        )
-                    }
-                )
-            )
-        }
+# we will be using many different schemas and prompts so we need this more reusable;
+# schemas are built once at import in services.schemas (TRANSCRIPTION_SCHEMA)
+TRANSCRIPTION_PROMPT = """
+        Please transcribe and analyze this audio clip. For each speaker turn:
+        1. Identify the speaker
+        2. Transcribe their exact words
+        3. Note the approximate timestamp
+        4. Analyze their tone
+        5. Provide a brief summary
+        
+        Format using HTML tags as specified in the schema.
+        Focus on accuracy and clarity.
+        """
+
+# Strict base64 alphabet; checked (with length % 4) before any decoding so
+# malformed payloads are rejected without allocating or reaching Gemini
+_B64_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
+# Long uploads are split into windows of this many seconds and transcribed in
+# parallel (0 = send the whole clip in one request)
+TRANSCRIBE_WINDOW_SECONDS = float(os.getenv("TRANSCRIBE_WINDOW_SECONDS") or 0)
+TRANSCRIBE_WINDOW_CONCURRENCY = 4
+
+async def _transcribe_windows(windows: List[bytes], mime_type: str) -> TranscriptionResponse:
+    """Transcribe consecutive windows of one recording concurrently and stitch
+    the turns back together in order"""
+    items = []
+    for index, window in enumerate(windows):
+        start = int(index * TRANSCRIBE_WINDOW_SECONDS)
+        prompt = (
+            f"{TRANSCRIPTION_PROMPT}\n        This clip starts at {start // 60:02d}:{start % 60:02d} "
+            "of the full recording; give timestamps relative to the full recording.\n"
+        )
+        items.append((window, prompt, mime_type))
+
+    gemini_service = GeminiService.create_transcription_service()
+    results = await gemini_service.analyze_many(items, concurrency=TRANSCRIBE_WINDOW_CONCURRENCY)
+    return TranscriptionResponse(
+        full_audio_transcribed=all(r.full_audio_transcribed for r in results),
+        conversation_analysis=[turn for r in results for turn in r.conversation_analysis]
     )
 
+# Exact-match cache of transcriptions keyed by a fingerprint of the analyzed
+# audio, so client retries and duplicate submissions skip the Gemini call
+_transcription_cache = TTLCache(maxsize=256, ttl=3600)
+
+async def _transcribe_cached(audio_data: Union[bytes, List[bytes]], mime_type: str) -> TranscriptionResponse:
+    """Transcribe audio bytes (or windows of one recording), reusing a previous
+    result for identical audio"""
+    # 128-bit BLAKE2b fingerprint: faster than SHA-256 and a compact key
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in (audio_data if isinstance(audio_data, list) else [audio_data]):
+        digest.update(chunk)
+    key = (digest.hexdigest(), mime_type)
+    cached = _transcription_cache.get(key)
+    if cached is not None:
+        logger.info("Transcription cache hit")
+        return cached
+
+    batcher = get_transcription_batcher(TRANSCRIPTION_PROMPT)
+    if isinstance(audio_data, list):
+        result = await _transcribe_windows(audio_data, mime_type)
+    elif batcher:
+        # Micro-batch with other in-flight uploads into one Gemini call
+        result = await batcher.submit(audio_data, mime_type)
+    else:
+        # Create a transcription-specific service instance
+        gemini_service = GeminiService.create_transcription_service()
+
+        result = await gemini_service.analyze_audio(
+            audio_data=audio_data,
+            prompt=TRANSCRIPTION_PROMPT,
+            mime_type=mime_type
+        )
+    _transcription_cache.set(key, result)
+    return result
+
 @router.post("/upload")
 async def upload_audio(request: AudioRequest):
     """Handle file upload and analysis with context"""
+    if isinstance(request.audio_base64, str) and (
+        len(request.audio_base64) & 3 or not _B64_RE.fullmatch(request.audio_base64)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid base64 audio data")
+
     try:
         # Handle potential binary data
         if isinstance(request.audio_base64, bytes):
@@ -145,8 +134,15 @@ async def upload_audio(request: AudioRequest):
             except UnicodeDecodeError:
                 request.audio_base64 = base64.b64encode(request.audio_base64).decode('utf-8')
 
-        # Process upload
-        file_id, size, is_valid, speech_ratio = await AudioUploadService.process_upload(request.audio_base64)
+        # Process upload; the service hands back the bytes to analyze so we
+        # don't re-read the stored file from disk. Large clips are pushed to
+        # the Gemini File API while the VAD runs
+        file_id, size, is_valid, speech_ratio, audio_data, mime_type = \
+            await AudioUploadService.process_upload(
+                request.audio_base64,
+                prefetch=GeminiService.create_transcription_service().upload_audio,
+                window_seconds=TRANSCRIBE_WINDOW_SECONDS or None
+            )
         
         if not is_valid:
             return TranscriptionResponse(
@@ -154,28 +150,63 @@ async def upload_audio(request: AudioRequest):
                 conversation_analysis=[]
             )
 
-        file_path = AudioUploadService.get_audio_path(file_id)
-        with open(file_path, "rb") as f:
-            audio_data = f.read()
+        return await _transcribe_cached(audio_data, mime_type)
+
+    except Exception as e:
+        logger.error(f"Upload error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload/transcribe-stream")
+async def upload_audio_transcribe_stream(request: AudioRequest):
+    """Transcribe an upload, streaming each turn as NDJSON as soon as it is generated"""
+    if len(request.audio_base64) & 3 or not _B64_RE.fullmatch(request.audio_base64):
+        raise HTTPException(status_code=400, detail="Invalid base64 audio data")
+
+    try:
+        file_id, size, is_valid, speech_ratio, audio_data, mime_type = \
+            await AudioUploadService.process_upload(request.audio_base64)
+    except Exception as e:
+        logger.error(f"Upload error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not is_valid:
+        return TranscriptionResponse(
+            full_audio_transcribed=False,
+            conversation_analysis=[]
+        )
+
+    gemini_service = GeminiService.create_transcription_service()
+
+    async def turns():
+        # One line per completed turn rather than per token fragment
+        async for turn in gemini_service.stream_turns(
+            audio_data, TRANSCRIPTION_PROMPT, mime_type
+        ):
+            yield turn.model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(turns(), media_type="application/x-ndjson")
+
+@router.post("/upload/stream")
+async def upload_audio_stream(request: Request):
+    """Handle a raw base64 request body, decoding it to disk as it streams in"""
+    try:
+        file_id, size, is_valid, speech_ratio, audio_path, mime_type = \
+            await AudioUploadService.process_stream(request.stream())
+
+        if not is_valid:
+            return TranscriptionResponse(
+                full_audio_transcribed=False,
+                conversation_analysis=[]
+            )
 
-        # Create a transcription-specific service instance
         gemini_service = GeminiService.create_transcription_service()
-        
-        transcription_prompt = """
-        Please transcribe and analyze this audio clip. For each speaker turn:
-        1. Identify the speaker
-        2. Transcribe their exact words
-        3. Note the approximate timestamp
-        4. Analyze their tone
-        5. Provide a brief summary
-        
-        Format using HTML tags as specified in the schema.
-        Focus on accuracy and clarity.
-        """
 
+        # Passing the path keeps the audio out of memory; the service sends it
+        # through the Gemini File API
         return await gemini_service.analyze_audio(
-            audio_data=audio_data,
-            prompt=transcription_prompt
+            audio_data=audio_path,
+            prompt=TRANSCRIPTION_PROMPT,
+            mime_type=mime_type
         )
 
     except Exception as e:
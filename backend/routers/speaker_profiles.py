@@ -1,16 +1,17 @@
+import asyncio
 import logging
 import tempfile
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from services.speaker_profile import SpeakerProfile, SpeakerCharacteristics, SpeakerProfileService
 import google.generativeai as genai
 from google.ai.generativelanguage_v1beta.types import content
 import os
-import json
-import base64
-import uuid
+import orjson
+import pybase64 as base64  # SIMD-accelerated drop-in for the stdlib module
+import aiofiles
 from services.gemini_service import GeminiService
 from enum import Enum
 
@@ -18,6 +19,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(
     prefix="/speaker-profiles",  # Remove api/v1 prefix
     tags=["speaker-profiles"],
+    default_response_class=ORJSONResponse,
 )
 
 speaker_service = SpeakerProfileService()
@@ -139,19 +141,35 @@ ANALYSIS_PROMPTS = {
     """
 }
 
+_MIME_MAP = {
+    'wav': 'audio/wav',
+    'mp3': 'audio/mp3',
+    'aiff': 'audio/aiff',
+    'aac': 'audio/aac',
+    'ogg': 'audio/ogg',
+    'flac': 'audio/flac',
+    # Content-Type spellings sent by browsers and mobile clients
+    'x-wav': 'audio/wav',
+    'wave': 'audio/wav',
+    'vnd.wave': 'audio/wav',
+    'mpeg': 'audio/mp3',
+    'mpeg3': 'audio/mp3',
+    'x-mp3': 'audio/mp3',
+    'x-mpeg': 'audio/mp3',
+    'x-aiff': 'audio/aiff',
+    'x-aac': 'audio/aac',
+    'vorbis': 'audio/ogg',
+    'x-flac': 'audio/flac',
+}
+
+def lookup_mime_type(format_str: str) -> Optional[str]:
+    """Map a format or Content-Type to a supported mime type, or None"""
+    # Drop parameters (e.g. "; codecs=opus") and any 'audio/' prefix
+    return _MIME_MAP.get(format_str.split(';', 1)[0].strip().lower().removeprefix('audio/'))
+
 def normalize_mime_type(format_str: str) -> str:
     """Convert format string to proper mime type"""
-    mime_map = {
-        'wav': 'audio/wav',
-        'mp3': 'audio/mp3',
-        'aiff': 'audio/aiff',
-        'aac': 'audio/aac',
-        'ogg': 'audio/ogg',
-        'flac': 'audio/flac'
-    }
-    # Strip 'audio/' prefix if present
-    format_str = format_str.lower().replace('audio/', '')
-    return mime_map.get(format_str, 'audio/wav')  # Default to wav
+    return lookup_mime_type(format_str) or 'audio/wav'  # Default to wav
 
 # Update endpoint path
 @router.post("", response_model=SpeakerProfileResponse)  # Empty string for root path
@@ -160,43 +178,89 @@ async def record_name(
 ):
     """Record user's name and create speaker profile"""
     logger.debug("Received speaker profile request")
-    logger.debug(f"Timestamp: {request.timestamp}")
-    logger.debug(f"Metadata: {request.metadata}")
+    logger.debug("Timestamp: %s", request.timestamp)
+    logger.debug("Metadata: %r", request.metadata)
     
     try:
         # Normalize mime type
         mime_type = normalize_mime_type(request.metadata.get("format", "wav"))
-        logger.debug(f"Normalized mime type: {mime_type}")
+        logger.debug("Normalized mime type: %s", mime_type)
 
         # Validate base64 data
         try:
-            audio_data = base64.b64decode(request.audio_base64)
-            logger.debug(f"Decoded audio length: {len(audio_data)}")
+            audio_data = await asyncio.to_thread(base64.b64decode, request.audio_base64)
+            logger.debug("Decoded audio length: %d", len(audio_data))
         except Exception as e:
             logger.error(f"Base64 decode error: {e}")
             raise HTTPException(status_code=400, detail="Invalid audio data encoding")
 
         # Process with name analyzer service
-        user_id = str(uuid.uuid4())  # Generate ID for new profile
+        # Hand over the decoded bytes (no second decode downstream)
         profile, analysis = await speaker_service.create_from_name_recording(
-            user_id=user_id,
-            audio_data=request.audio_base64,  # Pass encoded data directly
+            user_id=None,  # Generated, or the existing profile for a retried recording
+            audio_data=audio_data,
             mime_type=mime_type,  # Use normalized mime type
             relationship="self"
         )
 
         response_data = {
-            **analysis.dict(),
+            **analysis.model_dump(),
             "user_id": profile.user_id,
             "profile_created": True
         }
-        logger.debug(f"Returning response: {response_data}")
+        logger.debug("Returning response: %s", response_data)
         return response_data
 
     except Exception as e:
         logger.error(f"Error processing name recording: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Multipart upload: raw audio bytes, no base64 inflation on the wire or decode
+# pass on the server
+@router.post("/upload", response_model=SpeakerProfileResponse)
+async def record_name_upload(
+    audio: UploadFile = File(...),
+    metadata: str = Form("{}"),
+):
+    """Record user's name from a multipart audio upload"""
+    try:
+        try:
+            metadata_dict = orjson.loads(metadata)
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid metadata JSON")
+        # A real Content-Type is trusted here, so unknown types are rejected
+        # instead of being relabelled as WAV
+        format_str = metadata_dict.get("format") or audio.content_type or "wav"
+        mime_type = lookup_mime_type(format_str)
+        if mime_type is None:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Unsupported audio type: {format_str}. Supported types: "
+                       f"{', '.join(sorted(set(_MIME_MAP.values())))}"
+            )
+
+        audio_data = await audio.read()
+        logger.debug("Received audio upload: %d bytes", len(audio_data))
+
+        profile, analysis = await speaker_service.create_from_name_recording(
+            user_id=None,
+            audio_data=audio_data,
+            mime_type=mime_type,
+            relationship="self"
+        )
+
+        return {
+            **analysis.model_dump(),
+            "user_id": profile.user_id,
+            "profile_created": True
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing name recording: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Alternative endpoint for JSON/base64 input
 @router.post("/record-name/base64", response_model=SpeakerProfileResponse)
 async def record_name_base64(
@@ -206,19 +270,27 @@ async def record_name_base64(
 ):
     """Record user's name using base64 encoded audio"""
     try:
+        try:
+            audio_data = await asyncio.to_thread(base64.b64decode, audio_base64)
+        except Exception as e:
+            logger.error(f"Base64 decode error: {e}")
+            raise HTTPException(status_code=400, detail="Invalid audio data encoding")
+
         profile, analysis = await speaker_service.create_from_name_recording(
-            user_id=user_id or str(uuid.uuid4()),
-            audio_data=audio_base64,
+            user_id=user_id,
+            audio_data=audio_data,
             mime_type="audio/wav",
             relationship=relationship
         )
 
         return {
-            **analysis.dict(),
+            **analysis.model_dump(),
             "user_id": profile.user_id,
             "profile_created": True
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing name recording: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -226,7 +298,7 @@ async def record_name_base64(
 @router.get("/{user_id}", response_model=SpeakerProfile)
 async def get_speaker_profile(user_id: str):
     """Get a speaker profile by user ID"""
-    profile = await speaker_service.get_profile(user_id)
+    profile = speaker_service.get_profile(user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Speaker profile not found")
     return profile
@@ -234,13 +306,16 @@ async def get_speaker_profile(user_id: str):
 async def process_audio(file_path: str, analysis_type: AnalysisType) -> dict:
     """Process audio using Gemini with specified analysis type"""
     try:
-        with open(file_path, "rb") as f:
-            audio_data = f.read()
+        async with aiofiles.open(file_path, "rb") as f:
+            audio_data = await f.read()
 
-        return await gemini_service.analyze_audio(
-            audio_data,
-            ANALYSIS_PROMPTS[analysis_type],
-            ANALYSIS_SCHEMAS[analysis_type]
+        # The long per-type prompt is a cached system instruction, so each
+        # request only carries the audio and a short trigger
+        return await gemini_service.analyze_content(
+            content_data=audio_data,
+            prompt="Analyze this audio.",
+            schema=ANALYSIS_SCHEMAS[analysis_type],
+            system_instruction=ANALYSIS_PROMPTS[analysis_type]
         )
 
     except Exception as e:
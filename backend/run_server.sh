@@ -56,4 +56,20 @@ fi
 # Start FastAPI server
 echo "Starting FastAPI server..."
 export PYTHONPATH="$SCRIPT_DIR:$PYTHONPATH"
-uvicorn main:app --reload --port ${PORT:-8000} --host ${HOST:-0.0.0.0}
+if [ "${RELOAD:-0}" = "1" ]; then
+    # Development: single auto-reloading worker
+    uvicorn main:app --reload --port ${PORT:-8000} --host ${HOST:-0.0.0.0}
+else
+    # Production: uvloop + httptools. Speaker profiles and caches live in
+    # process memory, so a single worker is the default; only raise WORKERS
+    # once that state is shared (a profile created on one worker 404s on another)
+    WORKERS=${WORKERS:-1}
+    uvicorn main:app \
+        --loop uvloop \
+        --http httptools \
+        --workers "$WORKERS" \
+        --proxy-headers \
+        --forwarded-allow-ips '*' \
+        --port ${PORT:-8000} \
+        --host ${HOST:-0.0.0.0}
+fi
@@ -1,80 +1,123 @@
 import webrtcvad
-import wave
+import soundfile
 import logging
 from pathlib import Path
-from typing import Tuple
+from typing import BinaryIO, Optional, Tuple, Union
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
 class AudioValidator:
+    FRAME_DURATION_MS = 10  # Shorter frames for more precise detection
+    SAMPLES_PER_FRAME = 16000 * FRAME_DURATION_MS // 1000
+    FRAME_SIZE = SAMPLES_PER_FRAME * 2  # bytes of s16le per frame
+    WINDOW_SIZE = 5  # Check 5 frames at a time
+    SPEECH_RATIO_THRESHOLD = 0.08  # More permissive ratio but stricter detection
+    # Early exit: after every block of frames, stop once the clip clearly
+    # passes (ratio well above threshold) or can no longer reach the threshold
+    EARLY_EXIT_BLOCK = 100
+    EARLY_ACCEPT_RATIO = 0.15
+
     def __init__(self, aggressiveness: int = 3):  # Maximum aggressiveness for clearest speech
         self.vad = webrtcvad.Vad(aggressiveness)
-        logger.info(f"Initialized VAD with aggressiveness {aggressiveness}")
+        logger.info("Initialized VAD with aggressiveness %d", aggressiveness)
     
+    @staticmethod
+    def read_pcm16(source: Union[Path, BinaryIO]) -> Optional[np.ndarray]:
+        """Return the int16 samples of a 16 kHz mono 16-bit WAV, or None for anything else
+
+        Shared by upload sniffing and validation, so there is one WAV reader.
+        libsndfile parses the header and decodes straight into an int16 array,
+        without the pure-Python wave module's intermediate bytes.
+        """
+        try:
+            with soundfile.SoundFile(str(source) if isinstance(source, Path) else source) as sf:
+                logger.debug("Wave properties: channels=%d, subtype=%s, rate=%d, frames=%d",
+                             sf.channels, sf.subtype, sf.samplerate, sf.frames)
+                if (sf.channels, sf.subtype, sf.samplerate) != (1, 'PCM_16', 16000):
+                    return None
+                # Read all frames at once
+                return sf.read(dtype='int16')
+        except RuntimeError as e:  # libsndfile can't parse it
+            logger.debug("Not a readable WAV: %s", e)
+            return None
+
     def validate_wav(self, audio_path: Path) -> Tuple[bool, float]:
-        logger.info(f"Starting validation of {audio_path}")
+        logger.info("Starting validation of %s", audio_path)
         try:
-            with wave.open(str(audio_path), 'rb') as wf:
-                # Log wave file properties
-                logger.debug(f"Wave properties: channels={wf.getnchannels()}, "
-                           f"width={wf.getsampwidth()}, "
-                           f"rate={wf.getframerate()}, "
-                           f"frames={wf.getnframes()}")
-                
-                # Validate wave format
-                if wf.getnchannels() != 1:
-                    logger.error("Audio must be mono")
-                    return False, 0.0
-                if wf.getsampwidth() != 2:
-                    logger.error("Audio must be 16-bit")
-                    return False, 0.0
-                if wf.getframerate() != 16000:
-                    logger.error("Sample rate must be 16kHz")
-                    return False, 0.0
+            frames = self.read_pcm16(audio_path)
+        except Exception as e:
+            logger.error(f"VAD error: {str(e)}", exc_info=True)
+            return False, 0.0
+        if frames is None:
+            logger.error("Audio must be 16kHz mono 16-bit WAV")
+            return False, 0.0
 
-                # Read all frames at once
-                frames = wf.readframes(wf.getnframes())
-                audio_data = np.frombuffer(frames, dtype=np.int16)
-                
-                # More strict volume threshold
-                if np.max(np.abs(audio_data)) < 1000:
-                    logger.warning("Audio too quiet")
-                    return False, 0.0
+        return self.validate_pcm(frames)
+
+    def validate_pcm(self, frames: Union[bytes, np.ndarray], sample_rate: int = 16000) -> Tuple[bool, float]:
+        """Run VAD over mono s16le PCM, e.g. straight from an ffmpeg pipe
+
+        ``frames`` may be raw bytes or an int16 array.
+        """
+        try:
+            if sample_rate != 16000:
+                logger.error("Sample rate must be 16kHz")
+                return False, 0.0
+            view = memoryview(frames).cast('B')
+            audio_data = np.frombuffer(view, dtype=np.int16)
+            
+            # More strict volume threshold; peak from min/max avoids a full-size
+            # abs() temporary (and int16 abs overflow at -32768)
+            if not audio_data.size or max(int(audio_data.max()), -int(audio_data.min())) < 1000:
+                logger.warning("Audio too quiet")
+                return False, 0.0
 
-                frame_duration = 10  # Shorter frames for more precise detection
-                samples_per_frame = int(16000 * frame_duration / 1000)
-                frame_size = samples_per_frame * 2
+            frame_size = self.FRAME_SIZE
+            window_size = self.WINDOW_SIZE
 
-                windows = []  # Use sliding windows for better detection
-                window_size = 5  # Check 5 frames at a time
-                
-                total_frames = 0
-                speech_frames = 0
-                window = []
+            # One VAD call per whole frame into a flat flag array; slicing a
+            # memoryview avoids copying the PCM buffer frame by frame
+            total_frames = view.nbytes // frame_size
+            flags = np.zeros(total_frames, dtype=np.int32)
+            kernel = np.ones(window_size, dtype=np.int32)
+            speech_frames = 0
+            next_window_end = window_size - 1  # first full window not yet counted
+            speech_ratio = 0
+            has_speech = False
+            # Bound once: the per-frame C call is the loop's only real work
+            is_speech = self.vad.is_speech
+            for i in range(total_frames):
+                try:
+                    flags[i] = is_speech(view[i * frame_size:(i + 1) * frame_size], 16000)
+                except Exception as e:
+                    logger.debug("Frame error: %s", e)
 
-                for start in range(0, len(frames), frame_size):
-                    chunk = frames[start:start + frame_size]
-                    if len(chunk) == frame_size:
-                        total_frames += 1
-                        try:
-                            is_speech = self.vad.is_speech(chunk, 16000)
-                            window.append(is_speech)
-                            if len(window) > window_size:
-                                window.pop(0)
-                            # Count as speech if majority of window is speech
-                            if len(window) == window_size and sum(window) >= 3:
-                                speech_frames += 1
-                        except Exception as e:
-                            logger.debug(f"Frame error: {e}")
-                            continue
+                done = i + 1
+                if done % self.EARLY_EXIT_BLOCK and done != total_frames:
+                    continue
+                # Count as speech if majority of each full sliding window is
+                # speech; only windows completed since the last block
+                if done > next_window_end:
+                    segment = flags[next_window_end - window_size + 1:done]
+                    speech_frames += int((np.convolve(segment, kernel, 'valid') >= 3).sum())
+                    next_window_end = done
 
+                if speech_frames / done > self.EARLY_ACCEPT_RATIO:
+                    speech_ratio, has_speech = speech_frames / done, True
+                    break
+                best_case = (speech_frames + total_frames - done) / total_frames
+                if best_case <= self.SPEECH_RATIO_THRESHOLD:
+                    speech_ratio = speech_frames / total_frames
+                    break
+            else:
                 speech_ratio = speech_frames / total_frames if total_frames > 0 else 0
-                has_speech = speech_ratio > 0.08  # More permissive ratio but stricter detection
-                
-                logger.info(f"Speech detection: {speech_frames}/{total_frames} frames "
-                          f"({speech_ratio:.1%}) {'VALID' if has_speech else 'INVALID'}")
-                return has_speech, speech_ratio
+                has_speech = speech_ratio > self.SPEECH_RATIO_THRESHOLD
+            
+            logger.info("Speech detection: %d/%d frames (%.1f%%) %s",
+                        speech_frames, done if total_frames else 0, speech_ratio * 100,
+                        'VALID' if has_speech else 'INVALID')
+            return has_speech, speech_ratio
 
         except Exception as e:
             logger.error(f"VAD error: {str(e)}", exc_info=True)
@@ -1,27 +1,209 @@
 import os
+import re
+import asyncio
+import hashlib
+import io
 import logging
-import json
-from typing import Any, Dict, Optional, Union, List, Type
+import orjson
+from typing import Any, AsyncIterator, Dict, Mapping, Optional, Union, List, Tuple, Type
+from functools import cached_property
+from types import MappingProxyType
 import google.generativeai as genai
+from google.generativeai import caching
 from google.ai.generativelanguage_v1beta.types import content
-from pydantic import BaseModel, Field, ConfigDict
-from datetime import datetime
-import base64
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, model_validator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from services.schemas import TRANSCRIPTION_SCHEMA, BATCH_TRANSCRIPTION_SCHEMA
+from services.cache import TTLCache
+import pybase64 as base64  # SIMD-accelerated drop-in for the stdlib module
 
 logger = logging.getLogger(__name__)
 
+_configured_api_key: Optional[str] = None
+
+def configure_gemini() -> None:
+    """Configure the Gemini SDK once per process
+
+    genai.configure() discards the SDK's cached API clients, so running it for
+    every service instance throws away warm connections. Repeat calls with an
+    unchanged key are no-ops, letting all services share one client/channel.
+    That gRPC channel is the SDK's pooled transport: requests are multiplexed
+    over one kept-alive HTTP/2 connection, so no separate HTTP client is needed.
+    """
+    global _configured_api_key
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY environment variable not set")
+    if api_key != _configured_api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+
+# Clips larger than this go through the File API instead of inline base64; the
+# handle is cached by content hash so retries and re-analysis of the same audio
+# don't resend it
+INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+def _exceeds_inline_limit(data: Union[str, bytes]) -> bool:
+    """Whether raw bytes (or their base64 text) are over INLINE_MAX_BYTES"""
+    limit = INLINE_MAX_BYTES if isinstance(data, bytes) else INLINE_MAX_BYTES * 4 // 3
+    return len(data) > limit
+
+def _delete_uploaded_file(file: Any) -> None:
+    """Eviction hook: remove the remote copy without blocking the event loop"""
+    def delete() -> None:
+        try:
+            genai.delete_file(file.name)
+        except Exception as e:
+            logger.warning("Failed to delete Gemini file %s: %s", file.name, e)
+    asyncio.get_running_loop().run_in_executor(None, delete)
+
+# Gemini keeps uploads for 48h; let our handles lapse before the files do
+_uploaded_files = TTLCache(maxsize=256, ttl=47 * 3600, on_evict=_delete_uploaded_file)
+# Uploads still running, by cache key; concurrent requests for the same
+# payload await the one upload instead of creating a second remote file
+_uploads_in_flight: Dict[tuple, "asyncio.Task"] = {}
+
+# Fixed per-use-case instructions are registered with Gemini's context cache
+# and referenced by handle; our model handles lapse a little before the
+# server-side cache does
+PROMPT_CACHE_TTL = timedelta(hours=1)
+# Gemini rejects cached content under ~32k tokens; at ~4 chars per token,
+# shorter instructions skip the create round-trip entirely
+CACHE_MIN_TOKENS = 32768
+CACHE_MIN_CHARS = CACHE_MIN_TOKENS * 4
+
+def _cache_model_name(model_name: str) -> str:
+    """Context caching needs a fully qualified, explicitly versioned model"""
+    name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+    if not re.search(r"-\d{3}$", name) and not name.endswith("-exp"):
+        name += "-001"
+    return name
+
+# Gemini 1.5's output ceiling is shared by every clip in a batched call, so
+# batches are split to give each clip at least BATCH_CLIP_OUTPUT_TOKENS
+MODEL_MAX_OUTPUT_TOKENS = 8192
+BATCH_CLIP_OUTPUT_TOKENS = int(os.getenv("BATCH_CLIP_OUTPUT_TOKENS", "2048"))
+
+# Structural base64 check: validates without decoding the whole payload
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
+# Bounded: callers may pass per-call schemas, and each distinct one is a model
+_models = TTLCache(maxsize=64, ttl=24 * 3600)
+
+# The module's schemas live for the whole process, so their ids can't be reused
+# and are a free key; any other schema is keyed by a hash of its serialized form
+_CONSTANT_SCHEMA_KEYS = {
+    id(TRANSCRIPTION_SCHEMA): "transcription",
+    id(BATCH_TRANSCRIPTION_SCHEMA): "batch_transcription",
+}
+
+def _schema_key(schema: Any) -> Optional[str]:
+    """Stable cache key for a response schema"""
+    if schema is None:
+        return None
+    key = _CONSTANT_SCHEMA_KEYS.get(id(schema))
+    if key is None:
+        data = (type(schema).serialize(schema) if isinstance(schema, content.Schema)
+                else orjson.dumps(schema, option=orjson.OPT_SORT_KEYS))
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return key
+
+def _shared_model(model_name: str, generation_config: Mapping[str, Any]) -> genai.GenerativeModel:
+    """Return one GenerativeModel per (model name, generation config)
+
+    Shared by every GeminiService instance. Config values are scalars plus a
+    response schema, which is keyed by _schema_key.
+    """
+    key = (model_name, tuple(
+        (name, _schema_key(value) if name == "response_schema" else value)
+        for name, value in generation_config.items()
+    ))
+    model = _models.get(key)
+    if model is None:
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=dict(generation_config)
+        )
+        _models.set(key, model)
+    return model
+
+def _strip_json_fence(text: str) -> str:
+    """Return the body of a ```json fenced block, or the text unchanged
+
+    Uses index searches and a single slice rather than split(), so unfenced
+    responses (the common case with response_mime_type=application/json) cost
+    one scan and no allocation.
+    """
+    start = text.find("```json")
+    if start < 0:
+        return text
+    start += len("```json")
+    end = text.find("```", start)
+    return text[start:end] if end >= 0 else text[start:]
+
+class _ArrayItemScanner:
+    """Incrementally pull complete objects out of a streamed JSON document
+
+    Emits the raw text of each object that closes directly inside an array
+    nested in the top-level object (e.g. each ``conversation_analysis`` turn)
+    as soon as its closing brace arrives. Only the current object is buffered.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._item: Optional[List[str]] = None
+
+    def feed(self, text: str) -> List[str]:
+        items = []
+        start = 0 if self._item is not None else None
+        for i, char in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._stack == ["{", "["]:
+                    self._item, start = [], i
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                if char == "}" and self._item is not None and self._stack == ["{", "["]:
+                    self._item.append(text[start:i + 1])
+                    items.append("".join(self._item))
+                    self._item = start = None
+        if self._item is not None:
+            self._item.append(text[start:])
+        return items
+
 # Base Response Models
+
+# Extra per-turn data is flat scalars; a concrete type lets pydantic-core use
+# specialised validators instead of the generic Any path for every turn
+TurnValue = Union[str, float]
+
 class BaseResponse(BaseModel):
-    """Base class for all Gemini responses"""
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    metadata: Dict[str, Any] = Field(default_factory=dict)
+    """Base class for all Gemini responses
+
+    Nested turns aren't stamped individually; the outermost response carries
+    a single timestamp in its metadata.
+    """
+    timestamp: Optional[datetime] = None
+    metadata: Optional[Dict[str, Any]] = None
 
 class ToneAnalysis(BaseResponse):
     """Analysis of tone and emotional content"""
     tone: str
     indicators: List[str]
     confidence_score: Optional[float] = None
-    additional_metrics: Optional[Dict[str, Any]] = None
+    additional_metrics: Optional[Dict[str, float]] = None
 
 class ConversationTurn(BaseResponse):
     """Individual turn in a conversation"""
@@ -31,8 +213,8 @@ class ConversationTurn(BaseResponse):
     tone_analysis: Optional[ToneAnalysis] = None
     confidence: Optional[float] = None
     summary: Optional[str] = None
-    raw_data: Optional[Dict[str, Any]] = None
-    segments: Optional[List[Dict[str, Any]]] = None
+    raw_data: Optional[Dict[str, TurnValue]] = None
+    segments: Optional[List[Dict[str, TurnValue]]] = None
 
 class TranscriptionResponse(BaseModel):
     """Complete transcription analysis response"""
@@ -41,6 +223,49 @@ class TranscriptionResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
     processing_stats: Optional[Dict[str, Any]] = None
 
+    @model_validator(mode='after')
+    def _stamp(self) -> 'TranscriptionResponse':
+        """Stamp the response once, instead of every turn and tone analysis"""
+        metadata = self.metadata or {}
+        metadata.setdefault("response_timestamp", datetime.now(timezone.utc))
+        self.metadata = metadata
+        return self
+
+# Nested model fields filled by _construct_trusted: (model, field) -> (model, is_list)
+_NESTED_MODELS: Dict[Tuple[type, str], Tuple[type, bool]] = {
+    (TranscriptionResponse, "conversation_analysis"): (ConversationTurn, True),
+    (ConversationTurn, "tone_analysis"): (ToneAnalysis, False),
+}
+
+def _construct_trusted(model_cls: Type[BaseModel], data: Dict[str, Any]) -> BaseModel:
+    """Build a model tree from schema-constrained Gemini JSON without validation
+
+    Gemini already enforced the response schema server-side, so this uses
+    model_construct recursively for the known nested models.
+    """
+    values = {}
+    for name, value in data.items():
+        nested = _NESTED_MODELS.get((model_cls, name))
+        if nested is not None and value is not None:
+            nested_cls, is_list = nested
+            value = ([_construct_trusted(nested_cls, item) for item in value]
+                     if is_list else _construct_trusted(nested_cls, value))
+        values[name] = value
+    return model_cls.model_construct(**values)
+
+# Validator for the batch schema, built once: parses the JSON straight into
+# models in a single pass instead of orjson.loads + TranscriptionResponse(**r)
+_BATCH_RESULTS_ADAPTER = TypeAdapter(Dict[str, List[TranscriptionResponse]])
+
+# Core schemas are built at class creation; run one small document through
+# the validators and serializer at import so the first request doesn't pay
+# for any remaining first-use work inside its latency
+_WARMUP_JSON = (
+    '{"results":[{"full_audio_transcribed":false,"conversation_analysis":'
+    '[{"tone_analysis":{"tone":"","indicators":[]}}]}]}'
+)
+_BATCH_RESULTS_ADAPTER.validate_json(_WARMUP_JSON)["results"][0].model_dump_json()
+
 class GeminiConfig(BaseModel):
     """Base configuration for Gemini API calls"""
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -62,65 +287,10 @@ class TranscriptionConfig(GeminiConfig):
         data['response_schema'] = self._create_schema()
         super().__init__(**data)
         
-    def _create_schema(self) -> content.Schema:
-        """Generate the transcription schema"""
-        return content.Schema(
-            type=content.Type.OBJECT,
-            required=["full_audio_transcribed", "conversation_analysis"],
-            properties={
-                "full_audio_transcribed": content.Schema(
-                    type=content.Type.BOOLEAN,
-                    description="Indicates if the entire audio file has been transcribed."
-                ),
-                "conversation_analysis": content.Schema(
-                    type=content.Type.ARRAY,
-                    description="List of analyzed turns in the conversation.",
-                    items=content.Schema(
-                        type=content.Type.OBJECT,
-                        required=["diarization_html", "transcription_html", "timestamps_html", 
-                                 "tone_analysis", "confidence", "summary"],
-                        properties={
-                            "diarization_html": content.Schema(
-                                type=content.Type.STRING,
-                                description="HTML structure indicating the speaker label."
-                            ),
-                            "transcription_html": content.Schema(
-                                type=content.Type.STRING,
-                                description="HTML structure for the verbatim transcription."
-                            ),
-                            "timestamps_html": content.Schema(
-                                type=content.Type.STRING,
-                                description="HTML structure indicating approximate time range."
-                            ),
-                            "tone_analysis": content.Schema(
-                                type=content.Type.OBJECT,
-                                description="Analysis of the speaker's tone.",
-                                required=["tone", "indicators"],
-                                properties={
-                                    "tone": content.Schema(
-                                        type=content.Type.STRING,
-                                        description="The dominant tone identified."
-                                    ),
-                                    "indicators": content.Schema(
-                                        type=content.Type.ARRAY,
-                                        description="Supporting details for the identified tone.",
-                                        items=content.Schema(type=content.Type.STRING)
-                                    )
-                                }
-                            ),
-                            "confidence": content.Schema(
-                                type=content.Type.NUMBER,
-                                description="Confidence score for the tone detection."
-                            ),
-                            "summary": content.Schema(
-                                type=content.Type.STRING,
-                                description="Concise summary of the speaker's contribution."
-                            )
-                        }
-                    )
-                )
-            }
-        )
+    @classmethod
+    def _create_schema(cls) -> content.Schema:
+        """Return the shared transcription schema, built once at import"""
+        return TRANSCRIPTION_SCHEMA
 
 class GeminiService:
     """
@@ -131,137 +301,235 @@ class GeminiService:
     def __init__(self, config: Optional[GeminiConfig] = None):
         """Initialize service with optional custom configuration"""
         self.config = config or GeminiConfig()
+        self._instructed_models = TTLCache(
+            maxsize=32, ttl=(PROMPT_CACHE_TTL - timedelta(minutes=5)).total_seconds()
+        )
         self._setup_api()
         
     def _setup_api(self) -> None:
         """Configure Gemini API with authentication"""
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable not set")
-        genai.configure(api_key=api_key)
+        configure_gemini()
         
-    def _create_generation_config(self) -> Dict[str, Any]:
-        """Create generation configuration using service config"""
-        config = {
+    def _get_model(self, schema: Optional[content.Schema] = None) -> genai.GenerativeModel:
+        """Return the process-wide model for this service's config (and schema)"""
+        return _shared_model(self.config.model_name, self._create_generation_config(schema))
+
+    async def _get_instructed_model(self, system_instruction: str,
+                                    schema: Optional[content.Schema] = None) -> genai.GenerativeModel:
+        """Return a model whose fixed instruction is sent once, not per request
+
+        The instruction is registered with Gemini's context cache; prefixes too
+        short for caching (or unsupported models) fall back to a plain
+        system_instruction on a reused model.
+        """
+        key = (system_instruction, _schema_key(schema))
+        model = self._instructed_models.get(key)
+        if model is None:
+            generation_config = self._create_generation_config(schema)
+            if len(system_instruction) >= CACHE_MIN_CHARS:
+                try:
+                    # Blocking HTTP call in the SDK; keep it off the event loop
+                    cached = await asyncio.to_thread(
+                        caching.CachedContent.create,
+                        model=_cache_model_name(self.config.model_name),
+                        system_instruction=system_instruction,
+                        ttl=PROMPT_CACHE_TTL
+                    )
+                    model = genai.GenerativeModel.from_cached_content(
+                        cached_content=cached,
+                        generation_config=dict(generation_config)
+                    )
+                except Exception as e:
+                    logger.info("Context cache unavailable, using system_instruction: %s", e)
+            if model is None:
+                model = genai.GenerativeModel(
+                    model_name=self.config.model_name,
+                    generation_config=dict(generation_config),
+                    system_instruction=system_instruction
+                )
+            self._instructed_models.set(key, model)
+        return model
+
+    @cached_property
+    def _generation_config(self) -> Mapping[str, Any]:
+        """Read-only generation config for this service's config, built once"""
+        return MappingProxyType({
             "temperature": self.config.temperature,
             "top_p": self.config.top_p,
             "top_k": self.config.top_k,
             "max_output_tokens": self.config.max_output_tokens,
             "response_mime_type": self.config.response_mime_type,
-        }
-        
-        # Get the actual schema object if it's a property
-        if hasattr(self.config, 'response_schema'):
-            schema = self.config.response_schema
-            if isinstance(schema, property):
-                schema = schema.fget(self.config)
-            config["response_schema"] = schema
-            
-        return config
+            "response_schema": self.config.response_schema,
+        })
+
+    def _create_generation_config(self, schema: Optional[content.Schema] = None) -> Mapping[str, Any]:
+        """Return the generation config, with an optional schema override"""
+        if schema is None or schema is self.config.response_schema:
+            return self._generation_config
+        return MappingProxyType({**self._generation_config, "response_schema": schema})
 
     def _ensure_base64(self, data: Union[str, bytes]) -> str:
         """Ensure data is properly base64 encoded"""
         if isinstance(data, str):
-            try:
-                base64.b64decode(data)
-                return data
-            except:
+            if len(data) % 4 or not _BASE64_RE.fullmatch(data):
                 raise ValueError("Invalid base64 string provided")
+            return data
         elif isinstance(data, bytes):
-            return base64.b64encode(data).decode('utf-8')
+            return base64.b64encode_as_string(data)  # no intermediate bytes object
         raise ValueError("Input must be base64 string or bytes")
 
+    async def _content_part(self, content_data: Union[str, bytes, Path], mime_type: str) -> Any:
+        """Build the request part carrying the content to analyze"""
+        # Audio already on disk always goes through the File API so it never
+        # has to be loaded into memory
+        if isinstance(content_data, Path) or _exceeds_inline_limit(content_data):
+            return await self._uploaded_file(content_data, mime_type)
+        # Raw bytes go straight into the Blob (bytes() is a no-op for bytes);
+        # only caller-supplied strings are checked as base64
+        if isinstance(content_data, str):
+            data = self._ensure_base64(content_data)
+        else:
+            data = bytes(content_data)
+        return {
+            "inline_data": {
+                "mime_type": mime_type,
+                "data": data
+            }
+        }
+
+    async def upload_audio(self, audio_data: Union[str, bytes], mime_type: str) -> None:
+        """Upload a clip ahead of analysis when it's too big to send inline
+
+        The handle lands in the File API cache, so a later analyze call for the
+        same audio reuses it; small clips are left to go inline.
+        """
+        if _exceeds_inline_limit(audio_data):
+            await self._uploaded_file(audio_data, mime_type)
+
+    async def _uploaded_file(self, content_data: Union[str, bytes, Path], mime_type: str) -> Any:
+        """Upload a large clip or file once through the File API and reuse its handle
+
+        Handles live in _uploaded_files, whose eviction deletes the remote file.
+        """
+        if isinstance(content_data, Path):
+            # Files are keyed by path and stat instead of hashing their contents
+            stat = content_data.stat()
+            key = (str(content_data), stat.st_size, stat.st_mtime_ns, mime_type)
+            source = content_data
+        else:
+            if isinstance(content_data, str):
+                content_data = base64.b64decode(content_data, validate=True)
+            key = (hashlib.blake2b(content_data, digest_size=16).hexdigest(), mime_type)
+            source = io.BytesIO(content_data)
+        file = _uploaded_files.get(key)
+        if file is not None:
+            return file
+        upload = _uploads_in_flight.get(key)
+        if upload is None:
+            upload = _uploads_in_flight[key] = asyncio.create_task(
+                self._upload_file(key, source, mime_type)
+            )
+        # shield: one caller giving up mustn't cancel the upload for the others
+        return await asyncio.shield(upload)
+
+    @staticmethod
+    async def _upload_file(key: tuple, source: Any, mime_type: str) -> Any:
+        try:
+            file = await asyncio.to_thread(genai.upload_file, source, mime_type=mime_type)
+            _uploaded_files.set(key, file)
+            return file
+        finally:
+            del _uploads_in_flight[key]
+
     async def analyze_content(self, 
-                            content_data: Union[str, bytes],
+                            content_data: Union[str, bytes, Path],
                             prompt: str,
                             response_model: Optional[Type[BaseModel]] = None,
                             schema: Optional[content.Schema] = None,
-                            mime_type: str = "audio/wav") -> Union[Dict[str, Any], BaseModel]:
+                            mime_type: str = "audio/wav",
+                            system_instruction: Optional[str] = None,
+                            validate: bool = False) -> Union[Dict[str, Any], BaseModel]:
         """
         Generic content analysis method supporting various content types
         
         Args:
-            content_data: Raw content as base64 string or bytes
+            content_data: Raw content as base64 string or bytes, or a Path to upload
             prompt: Analysis prompt
             response_model: Optional Pydantic model for response validation
             schema: Optional response schema for Gemini model
             mime_type: Content MIME type
+            system_instruction: Optional fixed instruction, cached across calls
+            validate: Fully validate the response even when Gemini constrained
+                it to a response schema
             
         Returns:
             Analysis results as dict or specified response model
         """
         try:
-            # Override schema in config if provided
-            if schema:
-                original_schema = self.config.response_schema
-                self.config.response_schema = schema
-
-            model = genai.GenerativeModel(
-                model_name=self.config.model_name,
-                generation_config=self._create_generation_config()
-            )
+            # A schema override gets its own model rather than mutating the
+            # shared config
+            if system_instruction:
+                model = await self._get_instructed_model(system_instruction, schema)
+            else:
+                model = self._get_model(schema)
 
-            encoded_content = self._ensure_base64(content_data)
+            content_part = await self._content_part(content_data, mime_type)
             
-            chat = model.start_chat(history=[{
-                "role": "user",
-                "parts": [{
-                    "inline_data": {
-                        "mime_type": mime_type,
-                        "data": encoded_content
-                    }
-                }, prompt]
-            }])
-
-            response = chat.send_message("Analyze this content")
+            # One generate call carries both the content and the prompt; no
+            # chat history seeding + follow-up message round-trip
+            response = await model.generate_content_async([content_part, prompt])
             
             # Handle response parsing
             try:
-                # First try to parse as JSON
-                result = json.loads(response.text)
-            except (json.JSONDecodeError, AttributeError):
-                # If not JSON, try to get the text directly
-                try:
-                    result = response.text
-                    if isinstance(result, str):
-                        # Try to parse string as JSON
-                        try:
-                            result = json.loads(result)
-                        except json.JSONDecodeError:
-                            # If not JSON, wrap in dict
-                            result = {"text": result}
-                except AttributeError:
-                    # If no text attribute, try candidates
-                    if hasattr(response, 'candidates') and response.candidates:
-                        result = response.candidates[0].content.parts[0].text
-                        try:
-                            result = json.loads(result)
-                        except json.JSONDecodeError:
-                            result = {"text": result}
-                    else:
-                        raise ValueError("Unable to extract response content")
-            
-            # If we have a response model, validate the result
+                raw = response.text
+            except (AttributeError, ValueError):
+                # If no text accessor, try candidates
+                if hasattr(response, 'candidates') and response.candidates:
+                    raw = response.candidates[0].content.parts[0].text
+                else:
+                    raise ValueError("Unable to extract response content")
+
+            raw = _strip_json_fence(raw)
+
             if response_model:
-                return response_model(**result)
-            return result
+                # Output constrained by a response schema is trusted and built
+                # without re-validation; anything else is parsed and validated
+                # in one pass with pydantic-core
+                if not validate and (schema or self.config.response_schema) is not None:
+                    data = orjson.loads(raw)
+                    if isinstance(data, dict):
+                        result = _construct_trusted(response_model, data)
+                        if isinstance(result, TranscriptionResponse):
+                            result._stamp()  # validators don't run on construct
+                        return result
+                return response_model.model_validate_json(raw)
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # If not JSON, wrap in dict
+                return {"text": raw}
 
         except Exception as e:
             logger.error(f"Content analysis error: {e}", exc_info=True)
             raise ValueError(f"Analysis failed: {str(e)}")
-        finally:
-            # Restore original schema if we overrode it
-            if schema and 'original_schema' in locals():
-                self.config.response_schema = original_schema
+
+    _transcription_service: Optional['GeminiService'] = None
 
     @classmethod
     def create_transcription_service(cls) -> 'GeminiService':
-        """Factory method for creating a transcription-specific service"""
-        return cls(config=TranscriptionConfig())
+        """Factory method for the transcription-specific service
+
+        The service (and the model it holds) is created once and shared by
+        every request.
+        """
+        if cls._transcription_service is None:
+            cls._transcription_service = cls(config=TranscriptionConfig())
+        return cls._transcription_service
 
     async def analyze_audio(self, 
-                          audio_data: Union[str, bytes],
-                          prompt: str) -> TranscriptionResponse:
+                          audio_data: Union[str, bytes, Path],
+                          prompt: str,
+                          mime_type: str = "audio/wav") -> TranscriptionResponse:
         """
         Specialized method for audio analysis using transcription configuration
         
@@ -272,107 +540,137 @@ class GeminiService:
             content_data=audio_data,
             prompt=prompt,
             response_model=TranscriptionResponse,
-            mime_type="audio/wav"
+            mime_type=mime_type
         )
 
+    async def stream_audio(self,
+                           audio_data: Union[str, bytes, Path],
+                           prompt: str,
+                           mime_type: str = "audio/wav") -> AsyncIterator[str]:
+        """Yield the raw response text for an audio clip as Gemini generates it"""
+        model = self._get_model()
+        content_part = await self._content_part(audio_data, mime_type)
+        response = await model.generate_content_async([content_part, prompt], stream=True)
+        async for chunk in response:
+            # chunk.text raises on safety/finish-only chunks that carry no parts,
+            # which would cut the stream short; skip those instead
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                text = chunk.candidates[0].content.parts[0].text
+                if text:
+                    yield text
+
+    async def stream_turns(self,
+                           audio_data: Union[str, bytes, Path],
+                           prompt: str,
+                           mime_type: str = "audio/wav") -> AsyncIterator[ConversationTurn]:
+        """Yield each conversation turn as soon as its JSON object is complete"""
+        scanner = _ArrayItemScanner()
+        async for text in self.stream_audio(audio_data, prompt, mime_type):
+            for item in scanner.feed(text):
+                yield _construct_trusted(ConversationTurn, orjson.loads(item))
+
+    async def analyze_audio_batch(self,
+                                  items: List[Tuple[Union[str, bytes, Path], str]],
+                                  prompt: str) -> List[TranscriptionResponse]:
+        """
+        Analyze several audio clips with a single Gemini request
+
+        Args:
+            items: (audio_data, mime_type) pairs
+            prompt: Analysis prompt applied to every clip
+
+        Returns:
+            One TranscriptionResponse per item, aligned to input order
+        """
+        if len(items) == 1:
+            audio_data, mime_type = items[0]
+            return [await self.analyze_audio(audio_data, prompt, mime_type)]
+
+        per_call = max(1, MODEL_MAX_OUTPUT_TOKENS // BATCH_CLIP_OUTPUT_TOKENS)
+        if len(items) > per_call:
+            groups = await asyncio.gather(*(
+                self.analyze_audio_batch(items[start:start + per_call], prompt)
+                for start in range(0, len(items), per_call)
+            ))
+            return [result for group in groups for result in group]
+
+        try:
+            # Build (and, for large clips, upload) all parts concurrently
+            clip_parts = await asyncio.gather(*(
+                self._content_part(audio_data, mime_type)
+                for audio_data, mime_type in items
+            ))
+            parts: List[Any] = []
+            for index, part in enumerate(clip_parts, start=1):
+                parts.append(f"Audio clip {index}:")
+                parts.append(part)
+            parts.append(
+                f"{prompt}\nAnalyze each of the {len(items)} audio clips independently and "
+                "return exactly one entry in `results` per clip, in the same order."
+            )
+
+            model = self._get_model(BATCH_TRANSCRIPTION_SCHEMA)
+            # Merged over the model's config: scale the budget with the batch
+            response = await model.generate_content_async(
+                parts,
+                generation_config={
+                    "max_output_tokens": min(len(items) * BATCH_CLIP_OUTPUT_TOKENS,
+                                             MODEL_MAX_OUTPUT_TOKENS)
+                }
+            )
+            results = _BATCH_RESULTS_ADAPTER.validate_json(
+                _strip_json_fence(response.text)
+            )["results"]
+            if len(results) != len(items):
+                raise ValueError(f"Expected {len(items)} results, got {len(results)}")
+            return results
+
+        except Exception as e:
+            logger.error(f"Batch analysis error: {e}", exc_info=True)
+            raise ValueError(f"Batch analysis failed: {str(e)}")
+
+    async def analyze_many(self,
+                           items: List[Tuple[Union[str, bytes, Path], str, str]],
+                           concurrency: int = 64) -> List[TranscriptionResponse]:
+        """
+        Run analyze_audio for many (audio_data, prompt, mime_type) items concurrently
+
+        At most ``concurrency`` requests are in flight at once; results are
+        aligned to input order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def analyze_one(item: Tuple[Union[str, bytes, Path], str, str]) -> TranscriptionResponse:
+            async with semaphore:
+                return await self.analyze_audio(*item)
+
+        return await asyncio.gather(*(analyze_one(item) for item in items))
+
     async def analyze_text(self,
                          text: str,
                          prompt: str) -> Dict[str, Any]:
         """Specialized method for text analysis"""
         try:
-            model = genai.GenerativeModel(
-                model_name=self.config.model_name,
-                generation_config=self._create_generation_config()
-            )
-            
-            chat = model.start_chat(history=[{
-                "role": "user",
-                "parts": [text, prompt]
-            }])
+            model = self._get_model()
             
-            response = chat.send_message("Analyze this text")
-            return response.text if isinstance(response.text, dict) else response.json()
+            response = await model.generate_content_async([text, prompt])
+            raw = _strip_json_fence(response.text)
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                return {"text": raw}
             
         except Exception as e:
             logger.error(f"Text analysis error: {e}", exc_info=True)
             raise ValueError(f"Analysis failed: {str(e)}")
 
 class GeminiServiceWrapper:
+    """Dict-returning facade over a single, reused GeminiService"""
+
     def __init__(self):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable not set")
-        genai.configure(api_key=self.api_key)
-        # this config is specific to the transcription use case not all gemini requests.. we also have _create_name_analysis_schema and will be expanding
-        self.generation_config = {
-            "temperature": 1,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-            "response_schema": content.Schema(
-                type=content.Type.OBJECT,
-                enum=[],
-                required=["full_audio_transcribed", "conversation_analysis"],
-                properties={
-                    "full_audio_transcribed": content.Schema(
-                        type=content.Type.BOOLEAN,
-                        description="Indicates if the entire audio file has been transcribed.",
-                    ),
-                    "conversation_analysis": content.Schema(
-                        type=content.Type.ARRAY,
-                        description="List of analyzed turns in the conversation.",
-                        items=content.Schema(
-                            type=content.Type.OBJECT,
-                            enum=[],
-                            required=["diarization_html", "transcription_html", "timestamps_html", "tone_analysis", "confidence", "summary"],
-                            properties={
-                                "diarization_html": content.Schema(
-                                    type=content.Type.STRING,
-                                    description="HTML structure indicating the speaker label.",
-                                ),
-                                "transcription_html": content.Schema(
-                                    type=content.Type.STRING,
-                                    description="HTML structure for the verbatim transcription.",
-                                ),
-                                "timestamps_html": content.Schema(
-                                    type=content.Type.STRING,
-                                    description="HTML structure indicating approximate time range.",
-                                ),
-                                "tone_analysis": content.Schema(
-                                    type=content.Type.OBJECT,
-                                    description="Analysis of the speaker's tone.",
-                                    enum=[],
-                                    required=["tone", "indicators"],
-                                    properties={
-                                        "tone": content.Schema(
-                                            type=content.Type.STRING,
-                                            description="The dominant tone identified.",
-                                        ),
-                                        "indicators": content.Schema(
-                                            type=content.Type.ARRAY,
-                                            description="Supporting details for the identified tone.",
-                                            items=content.Schema(
-                                                type=content.Type.STRING,
-                                                description="A specific indicator of the tone.",
-                                            ),
-                                        ),
-                                    },
-                                ),
-                                "confidence": content.Schema(
-                                    type=content.Type.NUMBER,
-                                    description="Confidence score for the tone detection.",
-                                ),
-                                "summary": content.Schema(
-                                    type=content.Type.STRING,
-                                    description="Concise summary of the speaker's contribution.",
-                                ),
-                            },
-                        ),
-                    ),
-                },
-            ),
-            "response_mime_type": "application/json",
-        }
+        # The process-wide transcription service, so the wrapper shares its
+        # model and caches instead of building a second client
+        self._service = GeminiService.create_transcription_service()
 
     async def analyze_audio(self, audio_data, prompt: str = None, schema: content.Schema = None) -> dict:
         """Process audio through Gemini model and return analysis
@@ -383,20 +681,16 @@ class GeminiServiceWrapper:
             schema: Custom response schema (optional)
         """
         try:
-            # Use internal gemini service with standardized interface
-            gemini_service = GeminiService(model_name="gemini-2.0-flash-exp")
-            
-            # Use default schema if none provided
-            schema = schema or self.generation_config["response_schema"]
-            
             # Use default prompt if none provided
             prompt = prompt or """Please transcribe only what is actually spoken..."""
             
-            return await gemini_service.analyze_audio(
-                audio_data=audio_data,
+            result = await self._service.analyze_content(
+                content_data=audio_data,
                 prompt=prompt,
+                response_model=TranscriptionResponse,
                 schema=schema
             )
+            return result.model_dump()
 
         except Exception as e:
             logger.error(f"Gemini analysis error: {e}", exc_info=True)
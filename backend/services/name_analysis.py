@@ -1,13 +1,71 @@
 import os
+import hashlib
 import logging
 from typing import Dict, Optional
 from pydantic import BaseModel
 import mimetypes
-from google.ai.generativelanguage_v1beta.types import content
 import google.generativeai as genai
+from services.gemini_service import configure_gemini
+from services.schemas import NAME_ANALYSIS_GENERATION_CONFIG
+from services.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Fixed instructions for every name recording, defined once at import
+_ANALYSIS_PROMPT = (
+    "# Context Setting\n"
+    "Imagine onboarding as an exploratory field where speech prosody and name "
+    "pronunciation reveal aspects of personal identity, emotions, and cultural "
+    "dynamics. Consider this onboarding as akin to setting up a human playable "
+    "character (HPC) in a real-life role-playing game. Just as an HPC has defining "
+    "attributes—such as speech, personality, and behavioral cues—capturing a user's "
+    "unique pronunciation, tone, and accent patterns reveals underlying aspects of "
+    "their personality and comfort level.\n\n"
+
+    "# Interaction Format\n"
+    "The user was prompted to say '{greeting}, I'm {full_name}', with the user identified always address the user by name.\n\n"
+
+    "# Analysis Steps\n\n"
+    "1.) Transcribe just the user's complete name. Human names, dialects, accents, etc., "
+    "can be very tricky. Ensure the transcription makes sense by contemplating all "
+    "available context before finalizing the full name transcription. If the name "
+    "sounds fake or like the user is lying, call them out. Focus on capturing every "
+    "sound and inflection to reflect the authenticity of their identity. Be mindful "
+    "of user dynamics in pronunciation.\n\n"
+
+    "2.) Analyze the audio to determine what the user's speech prosody to their name "
+    "says about them. Employ extreme inference and capture every detail. Treat prosody "
+    "patterns (tone, rhythm, emphasis) like the 'character traits' of the HPC, which "
+    "might hint at confidence, pride, or cultural background. Consider how tone and "
+    "emphasis reveal depth, much like layers in character development.\n\n"
+
+    "3.) Analyze how the user feels about saying their name for this experience. "
+    "Observe the 'emotional response' layer of the HPC analogy. Evaluate if their "
+    "tone suggests comfort or hesitation. Infer if any detected hesitancy reflects "
+    "uncertainty or stems from the novelty of the interaction.\n\n"
+
+    "4.) Concisely assign a confidence score and reasoning to either confidence or "
+    "lack of confidence on hearing, understanding, and transcription of the speaker. "
+    "DO NOT BE OVERALLY OPTIMISTIC ABOUT PREDICTIONS. Return nulls if not enough info "
+    "(i.e., speech isn't detected or a name isn't spoken). Do not imagine names or "
+    "hallucinate information.\n\n"
+
+    "5.) Perform a psychoanalytic assessment: conduct a master psychoanalysis within "
+    "the confines and context of this audio, aiming to deeply understand the user.\n\n"
+
+    "6.) Determine the user's location and background: analyze ambient sounds and "
+    "contextual clues to infer details about the user's current environment or setting. "
+    "This includes identifying any background noise that may influence the clarity or "
+    "emotional tone of the user's speech.\n\n"
+
+    "# Important Notes\n"
+    "- Take context from the user's accent to be triple sure of correct transcription\n"
+    "- Do not specifically mention 'the audio', 'the audio file' or otherwise\n"
+    "- Analyze speech patterns to build a personalized experience\n"
+    "- Respect the individuality and nuances within each user's 'character profile'\n"
+    "- BE SURE TO NOT LIE OR HALLUCINATE\n"
+)
+
 class NameAnalysis(BaseModel):
     name: str
     prosody: str
@@ -17,157 +75,89 @@ class NameAnalysis(BaseModel):
     psychoanalysis: str
     location_background: str
 
+# Compiled pydantic-core validator, called directly on the hot path
+_NAME_ANALYSIS_VALIDATOR = NameAnalysis.__pydantic_validator__
+
 class NameAnalysisService:
-    SUPPORTED_MIME_TYPES = {
-        'audio/wav': 'audio/wav',
-        'audio/mp3': 'audio/mp3',
-        'audio/aiff': 'audio/aiff',
-        'audio/aac': 'audio/aac',
-        'audio/ogg': 'audio/ogg',
-        'audio/flac': 'audio/flac',
-        # Add variations
-        'wav': 'audio/wav',
-        'mp3': 'audio/mp3',
-        'aiff': 'audio/aiff',
-        'aac': 'audio/aac',
-        'ogg': 'audio/ogg',
-        'flac': 'audio/flac'
+    SUPPORTED_MIME_TYPES = frozenset({
+        'audio/wav', 'audio/mp3', 'audio/aiff', 'audio/aac', 'audio/ogg', 'audio/flac'
+    })
+    # Built once for the error message instead of per rejected request
+    _SUPPORTED_LIST = ", ".join(sorted(SUPPORTED_MIME_TYPES))
+    # Accepted spellings (full type or bare extension) -> canonical mime type
+    _CANONICAL_MIME_TYPES = {
+        **{mime: mime for mime in SUPPORTED_MIME_TYPES},
+        **{mime.removeprefix('audio/'): mime for mime in SUPPORTED_MIME_TYPES},
     }
 
     def __init__(self):
         """Initialize with custom Gemini configuration for name analysis"""
-        self.generation_config = {
-            "temperature": 1,
-            "top_p": 0.95,
-            "top_k": 64,
-            "max_output_tokens": 8192,
-            "response_schema": content.Schema(
-                type=content.Type.OBJECT,
-                required=[
-                    "name",
-                    "prosody", 
-                    "feeling",
-                    "confidence_score",
-                    "confidence_reasoning",
-                    "psychoanalysis",
-                    "location_background",
-                ],
-                properties={
-                    "name": content.Schema(type=content.Type.STRING, description="The user's full name."),
-                    "prosody": content.Schema(type=content.Type.STRING, description="Speech analysis."),
-                    "feeling": content.Schema(type=content.Type.STRING, description="Emotional tone."),
-                    "confidence_score": content.Schema(type=content.Type.INTEGER, description="Confidence score."),
-                    "confidence_reasoning": content.Schema(type=content.Type.STRING, description="Reasoning."),
-                    "psychoanalysis": content.Schema(type=content.Type.STRING, description="Psychological insights."),
-                    "location_background": content.Schema(type=content.Type.STRING, description="Environment details."),
-                },
-            ),
-            "response_mime_type": "application/json",
-        }
-
-    async def analyze_name_recording(self, audio_data: str, mime_type: str) -> NameAnalysis:
-        """Perform deep analysis of name recording"""
-        try:
-            # Normalize mime type
-            mime_type = mime_type.lower()
-            if not mime_type.startswith('audio/'):
-                mime_type = f'audio/{mime_type}'
-
-            # Validate mime type
-            if mime_type not in self.SUPPORTED_MIME_TYPES:
-                raise ValueError(f"Unsupported mime type: {mime_type}. Supported types: {list(set(self.SUPPORTED_MIME_TYPES.values()))}")
-
-            prompt_text = (
-                "# Context Setting\n"
-                "Imagine onboarding as an exploratory field where speech prosody and name "
-                "pronunciation reveal aspects of personal identity, emotions, and cultural "
-                "dynamics. Consider this onboarding as akin to setting up a human playable "
-                "character (HPC) in a real-life role-playing game. Just as an HPC has defining "
-                "attributes—such as speech, personality, and behavioral cues—capturing a user's "
-                "unique pronunciation, tone, and accent patterns reveals underlying aspects of "
-                "their personality and comfort level.\n\n"
-                
-                "# Interaction Format\n"
-                "The user was prompted to say '{greeting}, I'm {full_name}', with the user identified always address the user by name.\n\n"
-                
-                "# Analysis Steps\n\n"
-                "1.) Transcribe just the user's complete name. Human names, dialects, accents, etc., "
-                "can be very tricky. Ensure the transcription makes sense by contemplating all "
-                "available context before finalizing the full name transcription. If the name "
-                "sounds fake or like the user is lying, call them out. Focus on capturing every "
-                "sound and inflection to reflect the authenticity of their identity. Be mindful "
-                "of user dynamics in pronunciation.\n\n"
-                
-                "2.) Analyze the audio to determine what the user's speech prosody to their name "
-                "says about them. Employ extreme inference and capture every detail. Treat prosody "
-                "patterns (tone, rhythm, emphasis) like the 'character traits' of the HPC, which "
-                "might hint at confidence, pride, or cultural background. Consider how tone and "
-                "emphasis reveal depth, much like layers in character development.\n\n"
-                
-                "3.) Analyze how the user feels about saying their name for this experience. "
-                "Observe the 'emotional response' layer of the HPC analogy. Evaluate if their "
-                "tone suggests comfort or hesitation. Infer if any detected hesitancy reflects "
-                "uncertainty or stems from the novelty of the interaction.\n\n"
-                
-                "4.) Concisely assign a confidence score and reasoning to either confidence or "
-                "lack of confidence on hearing, understanding, and transcription of the speaker. "
-                "DO NOT BE OVERALLY OPTIMISTIC ABOUT PREDICTIONS. Return nulls if not enough info "
-                "(i.e., speech isn't detected or a name isn't spoken). Do not imagine names or "
-                "hallucinate information.\n\n"
-                
-                "5.) Perform a psychoanalytic assessment: conduct a master psychoanalysis within "
-                "the confines and context of this audio, aiming to deeply understand the user.\n\n"
-                
-                "6.) Determine the user's location and background: analyze ambient sounds and "
-                "contextual clues to infer details about the user's current environment or setting. "
-                "This includes identifying any background noise that may influence the clarity or "
-                "emotional tone of the user's speech.\n\n"
-                
-                "# Important Notes\n"
-                "- Take context from the user's accent to be triple sure of correct transcription\n"
-                "- Do not specifically mention 'the audio', 'the audio file' or otherwise\n"
-                "- Analyze speech patterns to build a personalized experience\n"
-                "- Respect the individuality and nuances within each user's 'character profile'\n"
-                "- BE SURE TO NOT LIE OR HALLUCINATE\n"
-            )
+        self.generation_config = NAME_ANALYSIS_GENERATION_CONFIG
 
-            model = genai.GenerativeModel(
+    _model: Optional[genai.GenerativeModel] = None
+    # Analyses of identical recordings (re-submitted onboarding attempts),
+    # shared by every instance and keyed by a fingerprint of the audio
+    _analysis_cache = TTLCache(maxsize=1024, ttl=3600)
+
+    def _get_model(self) -> genai.GenerativeModel:
+        """Return the model shared by every instance, so all name analyses
+        reuse the SDK's one async client instead of building a model per call"""
+        if NameAnalysisService._model is None:
+            configure_gemini()
+            NameAnalysisService._model = genai.GenerativeModel(
                 model_name="gemini-1.5-flash",
                 generation_config=self.generation_config
             )
+        return NameAnalysisService._model
 
-            chat = model.start_chat(history=[{
-                "role": "user",
-                "parts": [{
-                    "inline_data": {
-                        "mime_type": mime_type,
-                        "data": audio_data
-                    }
-                }, prompt_text]
-            }])
-
-            response = chat.send_message("Process the audio and think deeply")
+    async def analyze_name_recording(self, audio_data: bytes, mime_type: str) -> NameAnalysis:
+        """Perform deep analysis of name recording"""
+        try:
+            # Normalize and validate the mime type; callers almost always pass
+            # a canonical lowercase type, which is found without lower()
+            canonical = (self._CANONICAL_MIME_TYPES.get(mime_type)
+                         or self._CANONICAL_MIME_TYPES.get(mime_type.lower()))
+            if canonical is None:
+                raise ValueError(f"Unsupported mime type: {mime_type}. Supported types: {self._SUPPORTED_LIST}")
+            mime_type = canonical
+
+            key = (hashlib.blake2b(audio_data, digest_size=16).hexdigest(), mime_type)
+            cached = self._analysis_cache.get(key)
+            if cached is not None:
+                logger.info("Name analysis cache hit")
+                return cached
+
+            model = self._get_model()
+
+            # Audio and instructions go out as one awaited turn: no chat history
+            # plus follow-up message, and the event loop isn't blocked. The
+            # reply is streamed and collected as it arrives, so parsing starts
+            # the moment the last chunk lands
+            response = await model.generate_content_async([{
+                "inline_data": {
+                    "mime_type": mime_type,
+                    "data": audio_data
+                }
+            }, _ANALYSIS_PROMPT], stream=True)
+            chunks = []
+            async for chunk in response:
+                if chunk.candidates and chunk.candidates[0].content.parts:
+                    chunks.append(chunk.candidates[0].content.parts[0].text)
             
-            # Debug log the response
-            logger.debug(f"Raw Gemini response: {response}")
-            logger.debug(f"Response text: {response.text}")
-            logger.debug(f"Response type: {type(response)}")
+            # Debug log the response (lazy: nothing is rendered unless enabled)
+            logger.debug("Raw Gemini response: %s", response)
             
             # Parse the response
             try:
-                if hasattr(response, 'candidates') and response.candidates:
-                    result = response.candidates[0].content.parts[0].text
-                else:
-                    result = response.text
+                result = "".join(chunks)
                 
-                logger.debug(f"Parsed result: {result}")
+                logger.debug("Parsed result: %s", result)
                 
-                import json
-                # Try parsing as JSON
-                if isinstance(result, str):
-                    result = json.loads(result)
-                
-                return NameAnalysis(**result)
+                # The text is always a str: parse and validate the JSON in one
+                # pass with pydantic-core, no separate loads step
+                analysis = _NAME_ANALYSIS_VALIDATOR.validate_json(result)
+                self._analysis_cache.set(key, analysis)
+                return analysis
                 
             except Exception as e:
                 logger.error(f"Failed to parse response: {str(e)}\nResponse: {response}")
@@ -176,3 +166,12 @@ class NameAnalysisService:
         except Exception as e:
             logger.error(f"Name analysis error: {e}", exc_info=True)
             raise ValueError(f"Failed to analyze name recording: {str(e)}")
+
+_name_analyzer: Optional[NameAnalysisService] = None
+
+def get_name_analyzer() -> NameAnalysisService:
+    """Return the process-wide NameAnalysisService"""
+    global _name_analyzer
+    if _name_analyzer is None:
+        _name_analyzer = NameAnalysisService()
+    return _name_analyzer
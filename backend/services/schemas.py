@@ -0,0 +1,117 @@
+from google.ai.generativelanguage_v1beta.types import content
+
+# Response schemas are static, so they are built once at import and shared by
+# every service/router instead of being reconstructed per request.
+
+TRANSCRIPTION_SCHEMA = content.Schema(
+    type=content.Type.OBJECT,
+    required=["full_audio_transcribed", "conversation_analysis"],
+    properties={
+        "full_audio_transcribed": content.Schema(
+            type=content.Type.BOOLEAN,
+            description="Indicates if the entire audio file has been transcribed."
+        ),
+        "conversation_analysis": content.Schema(
+            type=content.Type.ARRAY,
+            description="List of analyzed turns in the conversation.",
+            items=content.Schema(
+                type=content.Type.OBJECT,
+                required=["diarization_html", "transcription_html", "timestamps_html", 
+                         "tone_analysis", "confidence", "summary"],
+                properties={
+                    "diarization_html": content.Schema(
+                        type=content.Type.STRING,
+                        description="HTML structure indicating the speaker label."
+                    ),
+                    "transcription_html": content.Schema(
+                        type=content.Type.STRING,
+                        description="HTML structure for the verbatim transcription."
+                    ),
+                    "timestamps_html": content.Schema(
+                        type=content.Type.STRING,
+                        description="HTML structure indicating approximate time range."
+                    ),
+                    "tone_analysis": content.Schema(
+                        type=content.Type.OBJECT,
+                        description="Analysis of the speaker's tone.",
+                        required=["tone", "indicators"],
+                        properties={
+                            "tone": content.Schema(
+                                type=content.Type.STRING,
+                                description="The dominant tone identified."
+                            ),
+                            "indicators": content.Schema(
+                                type=content.Type.ARRAY,
+                                description="Supporting details for the identified tone.",
+                                items=content.Schema(type=content.Type.STRING)
+                            )
+                        }
+                    ),
+                    "confidence": content.Schema(
+                        type=content.Type.NUMBER,
+                        description="Confidence score for the tone detection."
+                    ),
+                    "summary": content.Schema(
+                        type=content.Type.STRING,
+                        description="Concise summary of the speaker's contribution."
+                    )
+                }
+            )
+        )
+    }
+)
+
+# Generation config for the transcription use case
+GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_schema": TRANSCRIPTION_SCHEMA,
+    "response_mime_type": "application/json",
+}
+
+# Several clips analyzed in one request; ``results`` is aligned to input order
+BATCH_TRANSCRIPTION_SCHEMA = content.Schema(
+    type=content.Type.OBJECT,
+    required=["results"],
+    properties={
+        "results": content.Schema(
+            type=content.Type.ARRAY,
+            description="One transcription per audio clip, in the order the clips were given.",
+            items=TRANSCRIPTION_SCHEMA
+        )
+    }
+)
+
+# Name recording analysis (onboarding)
+NAME_ANALYSIS_SCHEMA = content.Schema(
+    type=content.Type.OBJECT,
+    required=[
+        "name",
+        "prosody",
+        "feeling",
+        "confidence_score",
+        "confidence_reasoning",
+        "psychoanalysis",
+        "location_background",
+    ],
+    properties={
+        "name": content.Schema(type=content.Type.STRING, description="The user's full name."),
+        "prosody": content.Schema(type=content.Type.STRING, description="Speech analysis."),
+        "feeling": content.Schema(type=content.Type.STRING, description="Emotional tone."),
+        "confidence_score": content.Schema(type=content.Type.INTEGER, description="Confidence score."),
+        "confidence_reasoning": content.Schema(type=content.Type.STRING, description="Reasoning."),
+        "psychoanalysis": content.Schema(type=content.Type.STRING, description="Psychological insights."),
+        "location_background": content.Schema(type=content.Type.STRING, description="Environment details."),
+    },
+)
+
+NAME_ANALYSIS_GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192,
+    "response_schema": NAME_ANALYSIS_SCHEMA,
+    "response_mime_type": "application/json",
+}
@@ -1,9 +1,15 @@
 # NOT IN USE
+import re
 import logging
 from .speaker_profile import SpeakerProfileService
 
 logger = logging.getLogger(__name__)
 
+# Rest of the line after "name:" in a speaker context, in one scan
+_NAME_RE = re.compile(r'name:\s*([^\n]+)')
+# Generic diarization label emitted by Gemini, capturing the speaker number
+_SPEAKER_RE = re.compile(r'<h1>Speaker (\d+)</h1>')
+
 class SpeakerIdentificationService:
     def __init__(self):
         self.speaker_profiles = SpeakerProfileService()
@@ -14,11 +20,17 @@ class SpeakerIdentificationService:
             return transcription_result
 
         try:
-            speaker_context = await self.speaker_profiles.get_speaker_context(user_id)
+            speaker_context = self.speaker_profiles.get_speaker_context(user_id)
             if not speaker_context:
                 return transcription_result
 
             speaker_info = self._parse_speaker_context(speaker_context)
+            if not speaker_info.get('name'):
+                return transcription_result
+
+            # Speaker number -> display name; one regex pass per turn labels
+            # every mapped speaker
+            speaker_map = {'1': speaker_info['name']}
             
             # Update speaker labels in conversation analysis
             if 'conversation_analysis' in transcription_result:
@@ -26,7 +38,7 @@ class SpeakerIdentificationService:
                     if 'diarization_html' in turn:
                         turn['diarization_html'] = self._replace_speaker_label(
                             turn['diarization_html'],
-                            speaker_info
+                            speaker_map
                         )
 
             return transcription_result
@@ -39,18 +51,12 @@ class SpeakerIdentificationService:
         """Extract speaker information from context"""
         # Add your logic to parse speaker name and other details
         # This is a simplified example
-        return {
-            'name': speaker_context.split('name:')[-1].split('\n')[0].strip()
-            if 'name:' in speaker_context else None
-        }
+        match = _NAME_RE.search(speaker_context)
+        return {'name': match.group(1).strip() if match else None}
 
-    def _replace_speaker_label(self, diarization_html: str, speaker_info: dict) -> str:
+    def _replace_speaker_label(self, diarization_html: str, speaker_map: dict) -> str:
         """Replace generic speaker labels with actual names"""
-        if not speaker_info.get('name'):
-            return diarization_html
-            
-        # Replace generic Speaker 1 with actual name
-        return diarization_html.replace(
-            '<h1>Speaker 1</h1>', 
-            f'<h1>{speaker_info["name"]}</h1>'
+        return _SPEAKER_RE.sub(
+            lambda m: f'<h1>{speaker_map[m.group(1)]}</h1>' if m.group(1) in speaker_map else m.group(0),
+            diarization_html
         )
@@ -1,11 +1,23 @@
+import os
+import asyncio
+import contextlib
+import threading
+import hashlib
 import logging
-from typing import Dict, List, Optional
-from pydantic import BaseModel
-from .name_analysis import NameAnalysis, NameAnalysisService
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+from pydantic import BaseModel, ConfigDict
+from .name_analysis import NameAnalysis, get_name_analyzer
+from .cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Profiles are frozen: the related-profile index and the rendered context
+# cache are only kept correct if every change goes through add_profile
 class SpeakerCharacteristics(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     prosody: str
     feeling: str
     speech_style: str
@@ -14,95 +26,271 @@ class SpeakerCharacteristics(BaseModel):
     related_to: Optional[str] = None  # user_id of the main user
 
 class SpeakerProfile(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     user_id: str
     name: str
     characteristics: SpeakerCharacteristics
-    voice_samples: List[str]  # Base64 encoded audio samples
+    voice_samples: List[str]  # Content hashes of recordings in VOICE_SAMPLE_DIR
     confidence_score: int
     confidence_reasoning: str
     psychoanalysis: str
     location_background: str
 
+# Recordings are stored on disk by content hash; profiles only keep the hash
+VOICE_SAMPLE_DIR = Path("uploads") / "voice_samples"
+_pending_writes: Set[asyncio.Task] = set()
+
+def _write_voice_sample(path: Path, audio_data: bytes) -> None:
+    if not path.exists():  # identical recordings are stored once
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a reader never sees a partial sample
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(audio_data)
+        os.replace(tmp_path, path)
+
+async def load_voice_sample(digest: str) -> bytes:
+    """Read back a recording stored by store_voice_sample"""
+    return await asyncio.to_thread((VOICE_SAMPLE_DIR / digest).read_bytes)
+
+def _voice_sample_written(task: asyncio.Task) -> None:
+    _pending_writes.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Failed to store voice sample: {task.exception()}")
+
+def voice_sample_digest(audio_data: bytes) -> str:
+    """Content hash a recording is stored (and deduplicated) under"""
+    return hashlib.blake2b(audio_data, digest_size=16).hexdigest()
+
+def store_voice_sample(audio_data: bytes, digest: Optional[str] = None) -> str:
+    """Write a recording to VOICE_SAMPLE_DIR in the background; returns its hash"""
+    digest = digest or voice_sample_digest(audio_data)
+    task = asyncio.create_task(
+        asyncio.to_thread(_write_voice_sample, VOICE_SAMPLE_DIR / digest, audio_data)
+    )
+    _pending_writes.add(task)  # keep a reference until the write finishes
+    task.add_done_callback(_voice_sample_written)
+    return digest
+
+# Speaker context handed to prompts; no source indentation, so no wasted tokens
+_CONTEXT_TEMPLATE = (
+    "Speaker context:\n"
+    "- Name: {name}\n"
+    "- Prosody: {prosody}\n"
+    "- Speech style: {speech_style}\n"
+    "- Role: {role}\n"
+    "- Feeling: {feeling}\n"
+)
+
+# Profiles kept per process; beyond this the least recently used are
+# dropped, and each expires this many seconds after it was stored
+MAX_PROFILES = int(os.getenv("SPEAKER_PROFILES_MAX", "10000"))
+PROFILE_TTL = float(os.getenv("SPEAKER_PROFILES_TTL", str(24 * 3600)))
+
 class SpeakerProfileService:
-    def __init__(self):
-        self.profiles: Dict[str, SpeakerProfile] = {}
-        self.name_analyzer = NameAnalysisService()
+    def __init__(self, max_profiles: int = MAX_PROFILES, profile_ttl: float = PROFILE_TTL):
+        # related_to user_id -> ids of the profiles linked to it
+        self._related: Dict[str, Set[str]] = {}
+        # Rendered get_speaker_context strings; dropped whenever the profile
+        # is replaced, relinked or evicted
+        self._context_cache: Dict[str, str] = {}
+        # recording digest -> [lock, holders + waiters] for profile creation
+        self._locks: Dict[str, list] = {}
+        # recording digest -> user_id of the profile created from it
+        self._recordings: Dict[str, str] = {}
+        # Every access is a plain cache operation with no await in between, so
+        # coroutines can't interleave mid-update and no lock is needed
+        self.profiles = TTLCache(maxsize=max_profiles, ttl=profile_ttl, on_evict=self._evicted)
+        self.name_analyzer = get_name_analyzer()  # shared by every instance
         
-    async def add_profile(self, profile: SpeakerProfile):
-        self.profiles[profile.user_id] = profile
+    def _index(self, profile: SpeakerProfile) -> None:
+        related_to = profile.characteristics.related_to
+        if related_to:
+            self._related.setdefault(related_to, set()).add(profile.user_id)
+
+    def _unindex(self, profile: SpeakerProfile) -> None:
+        related_ids = self._related.get(profile.characteristics.related_to)
+        if related_ids is not None:
+            related_ids.discard(profile.user_id)
+            if not related_ids:
+                del self._related[profile.characteristics.related_to]
+
+    def _evicted(self, profile: SpeakerProfile) -> None:
+        self._unindex(profile)
+        self._context_cache.pop(profile.user_id, None)
+        for digest in profile.voice_samples:
+            if self._recordings.get(digest) == profile.user_id:
+                del self._recordings[digest]
+
+    def add_profile(self, profile: SpeakerProfile):
+        previous = self.profiles.get(profile.user_id)
+        if previous is not None:
+            self._unindex(previous)
+        self._context_cache.pop(profile.user_id, None)
+        self.profiles.set(profile.user_id, profile)  # evictions unindex themselves
+        self._index(profile)
         
-    async def get_profile(self, user_id: str) -> Optional[SpeakerProfile]:
+    def get_profile(self, user_id: str) -> Optional[SpeakerProfile]:
         return self.profiles.get(user_id)
         
-    async def get_speaker_context(self, user_id: str) -> str:
+    def get_speaker_context(self, user_id: str) -> str:
         """Generate context string for speaker identification"""
-        profile = await self.get_profile(user_id)
+        profile = self.get_profile(user_id)
         if not profile:
             return ""
-            
-        return f"""
-        Speaker context:
-        - Name: {profile.name}
-        - Prosody: {profile.characteristics.prosody}
-        - Speech style: {profile.characteristics.speech_style}
-        - Role: {profile.characteristics.role}
-        - Feeling: {profile.characteristics.feeling}
-        """
+
+        context = self._context_cache.get(user_id)
+        if context is None:
+            characteristics = profile.characteristics
+            context = self._context_cache[user_id] = _CONTEXT_TEMPLATE.format_map({
+                "name": profile.name,
+                "prosody": characteristics.prosody,
+                "speech_style": characteristics.speech_style,
+                "role": characteristics.role,
+                "feeling": characteristics.feeling,
+            })
+        return context
     
-    async def get_related_profiles(self, user_id: str) -> List[SpeakerProfile]:
-        """Get all profiles related to a user"""
-        return [
-            profile for profile in self.profiles.values()
-            if profile.characteristics.related_to == user_id
-        ]
-
-    async def link_profiles(self, main_user_id: str, related_user_id: str, relationship: str):
+    def get_related_profiles(self, user_id: str) -> Iterator[SpeakerProfile]:
+        """Yield all profiles related to a user"""
+        # Iterate a snapshot of the index set, so a link or eviction while the
+        # caller is still consuming can't change it mid-loop. peek: listing
+        # relatives shouldn't count as using their profiles. Expired entries
+        # are still indexed until evicted, so skip them
+        for related_id in tuple(self._related.get(user_id) or ()):
+            profile = self.profiles.peek(related_id)
+            if profile is not None:
+                yield profile
+
+    def link_profiles(self, main_user_id: str, related_user_id: str, relationship: str):
         """Link two profiles with a relationship"""
-        if related_user_id in self.profiles:
-            profile = self.profiles[related_user_id]
-            profile.characteristics.relationship = relationship
-            profile.characteristics.related_to = main_user_id
+        profile = self.profiles.get(related_user_id)
+        if profile is not None:
+            characteristics = profile.characteristics
+            if characteristics.relationship == relationship and characteristics.related_to == main_user_id:
+                return  # already linked; keep the index and cached context
+            # Swap in an updated copy; add_profile moves it between index
+            # buckets and drops its cached context
+            self.add_profile(profile.model_copy(update={
+                "characteristics": profile.characteristics.model_copy(update={
+                    "relationship": relationship,
+                    "related_to": main_user_id
+                })
+            }))
+
+    @contextlib.asynccontextmanager
+    async def _recording_lock(self, digest: str) -> AsyncIterator[None]:
+        """Hold a per-recording lock; the entry is dropped once nobody holds or awaits it"""
+        entry = self._locks.get(digest)
+        if entry is None:
+            entry = self._locks[digest] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[digest]
 
     async def create_from_name_recording(
         self,
-        user_id: str,
-        audio_data: str,
+        user_id: Optional[str],
+        audio_data: bytes,
         mime_type: str = "audio/wav",
         relationship: str = "self"
     ) -> tuple[SpeakerProfile, NameAnalysis]:
-        """Create a speaker profile from a name recording"""
+        """Create a speaker profile from a decoded name recording
+
+        The recording itself is written to disk; the profile references it by
+        content hash rather than holding the audio in memory. Without a
+        ``user_id`` a new one is generated, unless the same recording already
+        has a live profile, which is returned instead (e.g. a client retry).
+        """
         try:
             # Add debug logging
-            logger.debug(f"Creating profile for user {user_id} with mime type {mime_type}")
-            
-            # Get name analysis from the audio
-            analysis = await self.name_analyzer.analyze_name_recording(
-                audio_data=audio_data,
-                mime_type=mime_type.lower()  # Normalize mime type
-            )
-            
-            # Create profile from analysis
-            profile = SpeakerProfile(
-                user_id=user_id,
-                name=analysis.name,
-                characteristics=SpeakerCharacteristics(
-                    prosody=analysis.prosody,
-                    feeling=analysis.feeling,
-                    speech_style=analysis.prosody,  # Use prosody as speech style
-                    role=relationship
-                ),
-                voice_samples=[audio_data],  # Store the base64 audio
-                confidence_score=analysis.confidence_score,
-                confidence_reasoning=analysis.confidence_reasoning,
-                psychoanalysis=analysis.psychoanalysis,
-                location_background=analysis.location_background
-            )
-            
-            # Store the profile
-            await self.add_profile(profile)
-            
+            logger.debug("Creating profile for user %s with mime type %s", user_id, mime_type)
+
+            # Overlapping requests for one recording run one at a time, so a
+            # duplicate waits for the first and finds its profile
+            digest = voice_sample_digest(audio_data)
+            async with self._recording_lock(digest):
+                existing_id = self._recordings.get(digest)
+                existing = self.profiles.get(existing_id) if existing_id else None
+                reuse = (
+                    existing is not None
+                    and user_id in (None, existing.user_id)
+                    and existing.characteristics.role == relationship
+                )
+                if reuse:
+                    # No Gemini call: the profile outlives the analyzer's cache,
+                    # and holds every field of the analysis it was built from
+                    return existing, self._analysis_from_profile(existing)
+                analysis = await self.name_analyzer.analyze_name_recording(
+                    audio_data=audio_data,
+                    mime_type=mime_type  # normalized by the analyzer
+                )
+                profile = self._profile_from_analysis(
+                    user_id or str(uuid.uuid4()), analysis, relationship,
+                    store_voice_sample(audio_data, digest)
+                )
+                # Store the profile
+                self.add_profile(profile)
+                self._recordings[digest] = profile.user_id
+
             return profile, analysis
-            
+
         except Exception as e:
             logger.error(f"Failed to create profile from name recording: {e}")
             raise ValueError(f"Profile creation failed: {str(e)}")
+
+    @staticmethod
+    def _analysis_from_profile(profile: SpeakerProfile) -> NameAnalysis:
+        return NameAnalysis.model_construct(
+            name=profile.name,
+            prosody=profile.characteristics.prosody,
+            feeling=profile.characteristics.feeling,
+            confidence_score=profile.confidence_score,
+            confidence_reasoning=profile.confidence_reasoning,
+            psychoanalysis=profile.psychoanalysis,
+            location_background=profile.location_background
+        )
+
+    @staticmethod
+    def _profile_from_analysis(user_id: str, analysis: NameAnalysis,
+                               relationship: str, voice_sample: str) -> SpeakerProfile:
+        # Every field comes from an already-validated NameAnalysis (or our
+        # own str arguments), so build the models without re-validating
+        return SpeakerProfile.model_construct(
+            user_id=user_id,
+            name=analysis.name,
+            characteristics=SpeakerCharacteristics.model_construct(
+                prosody=analysis.prosody,
+                feeling=analysis.feeling,
+                speech_style=analysis.prosody,  # Use prosody as speech style
+                role=relationship
+            ),
+            voice_samples=[voice_sample],
+            confidence_score=analysis.confidence_score,
+            confidence_reasoning=analysis.confidence_reasoning,
+            psychoanalysis=analysis.psychoanalysis,
+            location_background=analysis.location_background
+        )
+
+    async def create_many_from_name_recordings(
+        self,
+        items: List[Tuple[Optional[str], bytes, str, str]],
+        concurrency: int = 8
+    ) -> List[Tuple[SpeakerProfile, NameAnalysis]]:
+        """Create profiles for several (user_id, audio_data, mime_type, relationship)
+        recordings, e.g. a family, with at most ``concurrency`` Gemini calls in flight
+
+        Results are aligned to input order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def create_one(item: Tuple[Optional[str], bytes, str, str]) -> Tuple[SpeakerProfile, NameAnalysis]:
+            async with semaphore:
+                return await self.create_from_name_recording(*item)
+
+        return await asyncio.gather(*(create_one(item) for item in items))
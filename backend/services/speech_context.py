@@ -1,29 +1,48 @@
+import sys
+import time
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional
+from collections import deque
+from typing import Deque, Dict, List, Tuple
 
 logger = logging.getLogger(__name__)
 
 class SpeechContext:
+    # Segments older than this are never returned, so they're dropped; at
+    # most the newest MAX_SEGMENTS are kept per session
+    MAX_WINDOW_SECONDS = 3600
+    MAX_SEGMENTS = 10000
+
     def __init__(self):
-        self.contexts: Dict[str, List[dict]] = {}
-        
-    async def add_segment(self, session_id: str, segment: dict):
+        # Per session, (monotonic timestamp, segment) pairs in arrival order
+        self.contexts: Dict[str, Deque[Tuple[float, dict]]] = {}
+
+    def add_segment(self, session_id: str, segment: dict):
         """Add a speech segment to the context"""
-        if session_id not in self.contexts:
-            self.contexts[session_id] = []
-        self.contexts[session_id].append({
-            **segment,
-            'timestamp': datetime.now()
-        })
-        
-    async def get_context(self, session_id: str, window_seconds: int = 300) -> List[dict]:
+        segments = self.contexts.get(session_id)
+        if segments is None:
+            # maxlen makes the length cap free: appends drop the oldest entry.
+            # The key is interned so later lookups with an equal id string
+            # usually match by identity before comparing characters
+            segments = self.contexts[sys.intern(session_id)] = deque(maxlen=self.MAX_SEGMENTS)
+        now = time.monotonic()
+        segments.append((now, segment))
+        cutoff = now - self.MAX_WINDOW_SECONDS
+        while segments[0][0] < cutoff:
+            segments.popleft()
+
+    def get_context(self, session_id: str, window_seconds: int = 300) -> List[dict]:
         """Get recent context within time window"""
-        if session_id not in self.contexts:
+        segments = self.contexts.get(session_id)
+        if not segments:
             return []
-            
-        now = datetime.now()
-        return [
-            segment for segment in self.contexts[session_id]
-            if (now - segment['timestamp']).total_seconds() <= window_seconds
-        ]
+
+        # Timestamps are in order, so walk back from the newest segment only
+        # as far as the window reaches
+        cutoff = time.monotonic() - window_seconds
+        recent = []
+        for timestamp, segment in reversed(segments):
+            if timestamp < cutoff:
+                break
+            recent.append(segment)
+        recent.reverse()
+        return recent
@@ -0,0 +1,119 @@
+import os
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+from services.gemini_service import GeminiService, TranscriptionResponse
+
+logger = logging.getLogger(__name__)
+
+class TranscriptionBatcher:
+    """
+    Coalesces concurrent transcription requests into a single Gemini call.
+    Requests are queued for up to ``max_wait_ms`` (or until ``max_batch`` are
+    waiting) and then analyzed together; each caller gets its own result back.
+    """
+
+    def __init__(self, service: GeminiService, prompt: str,
+                 max_batch: int = 8, max_wait_ms: int = 50):
+        self.service = service
+        self.prompt = prompt
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Strong references to in-flight dispatches; the loop only keeps weak ones
+        self._dispatches: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the background batching loop on the running event loop"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop batching and fail every request that hasn't been answered"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in self._dispatches:
+            task.cancel()
+        await asyncio.gather(*self._dispatches, return_exceptions=True)
+        if self._queue:
+            while not self._queue.empty():
+                _, _, future = self._queue.get_nowait()
+                self._fail(future)
+
+    async def submit(self, audio_data: bytes, mime_type: str) -> TranscriptionResponse:
+        """Queue one clip and wait for its transcription"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((audio_data, mime_type, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            try:
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Requests already taken off the queue would otherwise hang
+                for _, _, future in batch:
+                    self._fail(future)
+                raise
+            # Dispatch without blocking accumulation of the next batch
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[bytes, str, asyncio.Future]]) -> None:
+        logger.info("Dispatching transcription batch of %d", len(batch))
+        try:
+            results = await self.service.analyze_audio_batch(
+                [(audio_data, mime_type) for audio_data, mime_type, _ in batch],
+                self.prompt
+            )
+        except asyncio.CancelledError:
+            # Cancelled by stop(): nothing else will answer these
+            for _, _, future in batch:
+                self._fail(future)
+            raise
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_exception(RuntimeError("Transcription batcher stopped"))
+
+_batcher: Optional[TranscriptionBatcher] = None
+
+def get_transcription_batcher(prompt: str) -> Optional[TranscriptionBatcher]:
+    """Return the shared batcher, or None when UPLOAD_BATCH_MAX is unset/1"""
+    global _batcher
+    max_batch = int(os.getenv("UPLOAD_BATCH_MAX", "1"))
+    if max_batch <= 1:
+        return None
+    if _batcher is None:
+        _batcher = TranscriptionBatcher(
+            GeminiService.create_transcription_service(),
+            prompt,
+            max_batch=max_batch,
+            max_wait_ms=int(os.getenv("UPLOAD_BATCH_WAIT_MS", "50"))
+        )
+    return _batcher